@@ -0,0 +1,145 @@
+"""Peak memory of the sales loader's customer maps: dicts vs KeyIndex.
+
+    python bench_dimension_maps.py --customers 10000000
+
+Writes a synthetic customer file (firstname, lastname, countryid,
+customerid; the rows populate_db2 reads back from the customer table) and
+builds the two customer maps from it in a fresh process per variant:
+
+  dict   all rows fetched, then cust_map / cust_by_country dicts (the old loader)
+  index  rows streamed into two KeyIndex maps (the current loader)
+
+Reports build time, peak RSS of the process (ru_maxrss) and lookup rate.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from key_index import KeyIndex, composite_key
+
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+               "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez"]
+
+
+def write_customers(path, customers, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for customerid in range(1, customers + 1):
+            first = rng.choice(FIRST_NAMES)
+            # mostly distinct surnames, with some repeats like a real customer base
+            last = f"{rng.choice(LAST_NAMES)}-{rng.randrange(customers)}"
+            f.write(f"{first}\t{last}\t{rng.randint(1, 60)}\t{customerid}\n")
+
+
+def read_customers(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            first, last, countryid, customerid = line.rstrip("\n").split("\t")
+            yield first, last, int(countryid), int(customerid)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def build_dicts(path):
+    rows = list(read_customers(path))  # cur.fetchall()
+    cust_map = {}
+    cust_by_country = {}
+    for f, l, country_id, cid in rows:
+        cust_map[f"{f} {l}".strip()] = cid
+        cust_by_country[(f, l, country_id)] = cid
+    return cust_map, cust_by_country
+
+
+def build_indexes(path):
+    cust_map = KeyIndex.build((f"{f} {l}".strip(), cid) for f, l, _, cid in read_customers(path))
+    cust_by_country = KeyIndex.build((composite_key(f, l, country_id), cid) for f, l, country_id, cid in read_customers(path))
+    return cust_map, cust_by_country
+
+
+def worker(variant, path, probes):
+    baseline = peak_rss_mb()
+    start_time = time.monotonic()
+    if variant == "dict":
+        cust_map, _ = build_dicts(path)
+    else:
+        cust_map, _ = build_indexes(path)
+    build_seconds = time.monotonic() - start_time
+
+    names = [f"{f} {l}" for f, l, _, _ in _sample(path, probes)]
+    start_time = time.monotonic()
+    if variant == "dict":
+        found = sum(cust_map.get(name) is not None for name in names)
+    else:
+        found = int((~np.isnan(cust_map.lookup(names))).sum())
+    lookup_seconds = time.monotonic() - start_time
+    print(json.dumps({
+        "variant": variant,
+        "entries": len(cust_map),
+        "build_seconds": build_seconds,
+        "baseline_mb": baseline,
+        "peak_mb": peak_rss_mb(),
+        "lookups_per_sec": len(names) / lookup_seconds if lookup_seconds > 0 else 0.0,
+        "found": found,
+    }))
+
+
+def _sample(path, probes):
+    for i, row in enumerate(read_customers(path)):
+        if i >= probes:
+            break
+        yield row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=10_000_000)
+    parser.add_argument("--file", help="reuse (or keep) the synthetic customer file at this path")
+    parser.add_argument("--variants", nargs="+", choices=["dict", "index"], default=["dict", "index"])
+    parser.add_argument("--probes", type=int, default=1_000_000, help="names looked up after the build")
+    parser.add_argument("--worker", choices=["dict", "index"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.file, args.probes)
+        return
+
+    path = args.file or os.path.join(tempfile.mkdtemp(), "customers.tsv")
+    if not os.path.exists(path):
+        print(f"Writing {args.customers:,} synthetic customers to {path}...")
+        write_customers(path, args.customers)
+
+    print(f"{'variant':<8}{'entries':>13}{'build s':>10}{'peak MB':>10}{'base MB':>10}{'lookups/sec':>14}")
+    for variant in args.variants:
+        proc = subprocess.run(
+            [sys.executable, __file__, "--worker", variant, "--file", path, "--probes", str(args.probes)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            if proc.returncode < 0:
+                reason = "killed (out of memory?)"
+            else:
+                reason = (proc.stderr.strip().splitlines() or [f"exit status {proc.returncode}"])[-1]
+            print(f"{variant:<8}  failed: {reason}")
+            continue
+        r = json.loads(proc.stdout)
+        print(f"{variant:<8}{r['entries']:>13,}{r['build_seconds']:>10.1f}{r['peak_mb']:>10.0f}"
+              f"{r['baseline_mb']:>10.0f}{r['lookups_per_sec']:>14,.0f}")
+
+    if not args.file:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+
+
+if __name__ == "__main__":
+    main()
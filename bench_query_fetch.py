@@ -0,0 +1,89 @@
+"""Benchmark: server-side cursor paging vs COPY into typed columns for large results.
+
+    python bench_query_fetch.py --rows 100000 1000000
+    python bench_query_fetch.py --rows 100000 --table   # sample admission_lab_results instead
+
+Reports wall time, peak traced Python memory while fetching (tracemalloc; NumPy
+buffers are traced, Arrow's own allocator is not) and the DataFrame's final
+in-memory size. The default query generates lab-result-shaped rows server-side
+so it runs against an empty database.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+import psycopg2
+
+from copy_fetch import copy_query_to_dataframe, pyarrow
+from query_stream import QueryStream
+from utils import get_db_url
+
+SYNTHETIC_SQL = """
+SELECT 'P' || (g % 10000)::text AS patient_id,
+       (g % 7)::int AS admission_id,
+       (g % 50)::int AS lab_test_id,
+       (random() * 100)::real AS lab_value,
+       timestamp '2000-01-01' + g * interval '1 minute' AS lab_datetime
+FROM generate_series(1, {rows}) AS g
+"""
+
+TABLE_SQL = "SELECT * FROM admission_lab_results LIMIT {rows}"
+
+
+def fetch_cursor(conn, sql):
+    stream = QueryStream(conn, sql, page_size=10_000, max_rows=10**12, max_bytes=10**15)
+    return stream.fetch_rest()
+
+
+def fetch_copy_numpy(conn, sql):
+    return copy_query_to_dataframe(conn, sql, arrow=False)[0]
+
+
+def fetch_copy_arrow(conn, sql):
+    return copy_query_to_dataframe(conn, sql, arrow=True)[0]
+
+
+METHODS = {
+    "cursor": fetch_cursor,
+    "copy": fetch_copy_numpy,
+    "copy-arrow": fetch_copy_arrow,
+}
+
+
+def measure(conn, fetch, sql):
+    gc.collect()
+    tracemalloc.start()
+    start_time = time.monotonic()
+    df = fetch(conn, sql)
+    elapsed = time.monotonic() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    conn.rollback()
+    return len(df), elapsed, peak, int(df.memory_usage(deep=True).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--table", action="store_true", help="read admission_lab_results instead of generated rows")
+    parser.add_argument("--methods", nargs="+", choices=list(METHODS), default=list(METHODS))
+    args = parser.parse_args()
+
+    methods = [m for m in args.methods if m != "copy-arrow" or pyarrow is not None]
+    if len(methods) < len(args.methods):
+        print("pyarrow is not installed; skipping copy-arrow")
+
+    conn = psycopg2.connect(get_db_url())
+    print(f"{'rows':>10}  {'method':<11}{'seconds':>9}{'rows/sec':>12}{'peak MB':>10}{'frame MB':>10}")
+    for rows in args.rows:
+        sql = (TABLE_SQL if args.table else SYNTHETIC_SQL).format(rows=rows)
+        for name in methods:
+            fetched, elapsed, peak, frame = measure(conn, METHODS[name], sql)
+            rate = fetched / elapsed if elapsed > 0 else 0.0
+            print(f"{fetched:>10,}  {name:<11}{elapsed:>9.2f}{rate:>12,.0f}{peak / 1e6:>10.1f}{frame / 1e6:>10.1f}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
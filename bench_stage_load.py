@@ -0,0 +1,74 @@
+"""Compare staging loaders (COPY vs execute_batch) on the FILES entries.
+
+Run after populate_db.py has created the stage_* tables:
+
+    python bench_stage_load.py labs patients --repeat 3
+
+Each loader reloads the stage table from scratch, so the numbers are
+directly comparable rows/sec for the same file on the same server.
+
+Measured with --repeat 3 against a local PostgreSQL 16 on one core, using
+generate_data.py --scale 10 output (1,000 patients, 1.13M lab rows):
+
+    file        loader            rows   seconds      rows/sec
+    patients    copy             1,000      0.00       219,473
+    patients    batch            1,000      0.03        32,138
+    admissions  copy             3,780      0.01       343,753
+    admissions  batch            3,780      0.08        49,251
+    diagnoses   copy             3,780      0.01       546,261
+    diagnoses   batch            3,780      0.08        48,184
+    labs        copy         1,133,388      3.09       366,768
+    labs        batch        1,133,388     38.98        29,077
+
+COPY loads the labs file about 12.6x faster than execute_batch.
+"""
+import argparse
+import time
+
+import psycopg2
+
+from populate_db import EXPECTED_COLUMNS, FILES, STAGE_LOADERS
+from utils import get_db_url
+
+
+def bench(conn, name, loader_name, repeat):
+    entry = FILES[name]
+    loader = STAGE_LOADERS[loader_name]
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        start_time = time.monotonic()
+        rows = loader(
+            conn,
+            entry["filename"],
+            f"stage_{name}",
+            EXPECTED_COLUMNS[name],
+            entry.get("batch_size", 5_000)
+        )
+        timings.append(time.monotonic() - start_time)
+    best = min(timings)
+    return rows, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", default=list(FILES), help="FILES entries to benchmark")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per loader; the best time is reported")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(get_db_url())
+    results = []
+    for name in args.names:
+        for loader_name in STAGE_LOADERS:
+            rows, best = bench(conn, name, loader_name, args.repeat)
+            results.append((name, loader_name, rows, best))
+    conn.close()
+
+    print(f"\n{'file':<12}{'loader':<8}{'rows':>14}{'seconds':>10}{'rows/sec':>14}")
+    for name, loader_name, rows, best in results:
+        rate = rows / best if best > 0 else 0.0
+        print(f"{name:<12}{loader_name:<8}{rows:>14,}{best:>10.2f}{rate:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Fetch whole query results with COPY ... TO STDOUT and parse them into typed columns."""
+import io
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (enables Arrow-backed columns)
+except ImportError:
+    pyarrow = None
+
+# Postgres type OIDs -> (numpy-backed dtype, Arrow-backed dtype); anything else stays text
+INTEGER_TYPES = {20, 21, 23}
+FLOAT_TYPES = {700, 701, 1700}
+BOOL_TYPES = {16}
+DATETIME_TYPES = {1082, 1114, 1184}
+
+
+def column_types(conn, sql):
+    """(name, type oid) for each output column of a query, without running it."""
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT * FROM ({sql}) AS q LIMIT 0")
+        return [(col.name, col.type_code) for col in cur.description]
+    finally:
+        cur.close()
+
+
+class _ByteCapReached(Exception):
+    pass
+
+
+class _CappedCopyBuffer:
+    """
+    COPY TO target that keeps rows until max_bytes of CSV have been read.
+
+    psycopg2 calls write() once per CopyData message, i.e. once per row, so the
+    kept data always ends on a row boundary. The row that would go over the cap
+    raises _ByteCapReached to stop the COPY.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.buffer = io.BytesIO()
+        self.max_bytes = max_bytes
+        self.truncated = False
+
+    def write(self, data):
+        if self.max_bytes and self.buffer.tell() + len(data) > self.max_bytes:
+            self.truncated = True
+            raise _ByteCapReached()
+        return self.buffer.write(data)
+
+
+def copy_query_to_dataframe(conn, sql, max_rows=None, arrow=None, statement_timeout=None, max_bytes=None):
+    """
+    Run a query through COPY (...) TO STDOUT in CSV and build a typed DataFrame.
+
+    The CSV is parsed by pandas' C reader straight into int/float/bool/datetime
+    columns instead of going through one Python tuple per row. With pyarrow
+    installed (or arrow=True) the columns are Arrow-backed. At most max_rows
+    rows, and rows up to max_bytes of CSV, are returned; returns (df, truncated).
+    Hitting the byte cap cancels the COPY and rolls back the current
+    transaction. `statement_timeout` (seconds) is set for the current
+    transaction, as in QueryStream.
+
+    Numeric columns come back as floats, and NULL and '' text both read as
+    missing; use the cursor path where that matters.
+    """
+    if arrow is None:
+        arrow = pyarrow is not None
+    sql = sql.strip().rstrip(";")
+    columns = column_types(conn, sql)
+    limit = f" LIMIT {int(max_rows) + 1}" if max_rows else ""
+
+    target = _CappedCopyBuffer(max_bytes)
+    cur = conn.cursor()
+    try:
+        if statement_timeout:
+            cur.execute("SET LOCAL statement_timeout = %s", (int(statement_timeout * 1000),))
+        cur.copy_expert(f"COPY (SELECT * FROM ({sql}) AS q{limit}) TO STDOUT WITH (FORMAT csv, HEADER false)", target)
+    except _ByteCapReached:
+        conn.cancel()  # stop the server from sending the rest of the result
+    finally:
+        cur.close()
+    if target.truncated:
+        conn.rollback()
+    buffer = target.buffer
+    buffer.seek(0)
+
+    names = [f"col{i}" for i in range(len(columns))]
+    dtype = {}
+    parse_dates = []
+    bool_columns = []
+    for key, (_, oid) in zip(names, columns):
+        if oid in INTEGER_TYPES:
+            dtype[key] = "int64[pyarrow]" if arrow else "Int64"
+        elif oid in FLOAT_TYPES:
+            dtype[key] = "double[pyarrow]" if arrow else "float64"
+        elif oid in BOOL_TYPES:
+            bool_columns.append(key)  # COPY writes t/f; read as text and map below
+            dtype[key] = "string[pyarrow]" if arrow else object
+        elif oid in DATETIME_TYPES:
+            parse_dates.append(key)
+        else:
+            dtype[key] = "string[pyarrow]" if arrow else object
+
+    if buffer.getbuffer().nbytes == 0:
+        df = pd.DataFrame({key: pd.Series(dtype=dtype.get(key, "datetime64[ns]")) for key in names})
+    else:
+        df = pd.read_csv(
+            buffer,
+            header=None,
+            names=names,
+            dtype=dtype,
+            parse_dates=parse_dates,
+            keep_default_na=False,
+            na_values=[""],
+            **({"dtype_backend": "pyarrow"} if arrow else {}),
+        )
+    for key in bool_columns:
+        df[key] = df[key].map({"t": True, "f": False}, na_action="ignore").astype(
+            "bool[pyarrow]" if arrow else "boolean"
+        )
+    df.columns = [name for name, _ in columns]
+
+    truncated = target.truncated
+    if max_rows and len(df) > max_rows:
+        truncated = True
+        df = df.iloc[:max_rows]
+    return df, truncated
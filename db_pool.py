@@ -0,0 +1,90 @@
+"""Pooled psycopg2 connections shared by the Streamlit query apps."""
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+
+class ConnectionPool:
+    """
+    Thread-safe connection pool with health checks and automatic reconnects.
+
+    Callers block (up to checkout_timeout seconds) when every connection is
+    checked out instead of failing straight away. A connection idle for longer
+    than health_check_interval is pinged before it is handed out, and broken
+    connections are discarded and replaced. Returned connections are rolled
+    back, so one failed transaction never leaks into the next checkout.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10, checkout_timeout=30, health_check_interval=30):
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self._pool = ThreadedConnectionPool(minconn, maxconn, dsn)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - self._last_used.get(id(conn), 0) < self.health_check_interval:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """Check out a healthy connection; pair every call with putconn."""
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise PoolError(f"no database connection free after {self.checkout_timeout}s")
+        try:
+            # After a server restart every idle connection is stale; discarding
+            # them all leaves the pool to open a fresh one on the last attempt
+            for _ in range(self.maxconn + 1):
+                conn = self._pool.getconn()
+                if self._healthy(conn):
+                    return conn
+                self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+            raise PoolError("no healthy database connection could be opened")
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        """Return a connection, rolling back whatever transaction it left open."""
+        close = bool(conn.closed)
+        if not close:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                close = True
+        if close:
+            self._last_used.pop(id(conn), None)
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+        try:
+            self._pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        self._pool.closeall()
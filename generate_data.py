@@ -0,0 +1,337 @@
+"""Generate synthetic EHR TSVs and sales data.csv at a chosen scale, for load benchmarks.
+
+    python generate_data.py --scale 10 --out generated
+    python generate_data.py --scale 1000 --only labs sales --seed 7
+
+Scale 1 is the size of the shipped samples (100 patients, ~370 admissions)
+plus ~110k lab rows and 10,000 sales lines; every count grows linearly
+with --scale. Output is written row by row (one patient or one block of
+sales lines at a time), so memory stays flat however large the files get.
+The same --seed and --scale always produce the same files: each patient
+draws from its own seeded generator, so the four EHR files agree on
+patients and admissions whichever of them are generated.
+
+The EHR files copy the samples' layout (UTF-8 with BOM, CRLF, millisecond
+timestamps) and load with populate_db.py; data.csv is tab-separated with
+;-packed order lists, as populate_db2.py reads it. Run the loaders from the
+output directory.
+"""
+import argparse
+import math
+import os
+import time
+import uuid
+
+import numpy as np
+
+from populate_db import EXPECTED_COLUMNS
+
+PATIENTS_PER_SCALE = 100
+SALES_LINES_PER_SCALE = 10_000
+CUSTOMERS_PER_SCALE = 2_000
+PRODUCTS = 500
+LABS_PER_ADMISSION = 300
+
+# Seed-sequence tags so each file draws from its own streams
+PATIENT_STREAM, DIAGNOSIS_STREAM, LAB_STREAM, SALES_STREAM = range(4)
+
+EHR_FILES = {
+    "patients": "PatientCorePopulatedTable.txt",
+    "admissions": "AdmissionsCorePopulatedTable.txt",
+    "diagnoses": "AdmissionsDiagnosesCorePopulatedTable.txt",
+    "labs": "LabsCorePopulatedTable.txt",
+}
+SALES_FILE = "data.csv"
+
+GENDERS = (["Female", "Male"], [0.52, 0.48])
+RACES = (["White", "Asian", "African American", "Unknown"], [0.49, 0.23, 0.15, 0.13])
+MARITAL_STATUSES = (["Married", "Single", "Divorced", "Unknown", "Separated", "Widowed"],
+                    [0.45, 0.32, 0.11, 0.06, 0.05, 0.01])
+LANGUAGES = (["English", "Spanish", "Icelandic", "Unknown"], [0.64, 0.18, 0.12, 0.06])
+ADMISSIONS_PER_PATIENT = ([1, 2, 3, 4, 5, 6, 7], [0.04, 0.18, 0.28, 0.18, 0.21, 0.06, 0.05])
+
+# Used when the sample diagnoses file is not next to this script
+FALLBACK_DIAGNOSES = [
+    ("Z22.31", "Carrier of bacterial disease due to meningococci"),
+    ("T46.3X6", "Underdosing of coronary vasodilators"),
+    ("M12.162", "Kaschin-Beck disease, left knee"),
+    ("K57.5", "Diverticular disease of both small and large intestine without perforation or abscess"),
+    ("I08.1", "Rheumatic disorders of both mitral and tricuspid valves"),
+    ("F11", "Opioid related disorders"),
+    ("E10.630", "Type 1 diabetes mellitus with periodontal disease"),
+    ("D65", "Disseminated intravascular coagulation [defibrination syndrome]"),
+    ("C18.3", "Malignant neoplasm of hepatic flexure"),
+    ("M01.X", "Direct infection of joint in infectious and parasitic diseases classified elsewhere"),
+]
+
+# (LabName, LabUnits, typical low, typical high)
+LAB_TESTS = [
+    ("CBC: WHITE BLOOD CELL COUNT", "k/cumm", 3.5, 11.0),
+    ("CBC: RED BLOOD CELL COUNT", "m/cumm", 3.9, 5.7),
+    ("CBC: HEMOGLOBIN", "gm/dl", 11.5, 17.0),
+    ("CBC: HEMATOCRIT", "%", 34.0, 50.0),
+    ("CBC: PLATELET COUNT", "k/cumm", 140.0, 400.0),
+    ("CBC: MCV", "fl", 80.0, 100.0),
+    ("CBC: NEUTROPHILS", "%", 40.0, 75.0),
+    ("CBC: LYMPHOCYTES", "%", 20.0, 45.0),
+    ("METABOLIC: GLUCOSE", "mg/dL", 65.0, 200.0),
+    ("METABOLIC: SODIUM", "mmol/L", 133.0, 147.0),
+    ("METABOLIC: POTASSIUM", "mmol/L", 3.4, 5.3),
+    ("METABOLIC: CHLORIDE", "mmol/L", 95.0, 110.0),
+    ("METABOLIC: CARBON DIOXIDE", "mmol/L", 20.0, 32.0),
+    ("METABOLIC: BUN", "mg/dL", 6.0, 25.0),
+    ("METABOLIC: CREATININE", "mg/dL", 0.6, 1.4),
+    ("METABOLIC: CALCIUM", "mg/dL", 8.5, 10.5),
+    ("METABOLIC: ALBUMIN", "gm/dL", 3.4, 5.0),
+    ("METABOLIC: ALT/SGPT", "U/L", 5.0, 60.0),
+    ("METABOLIC: AST/SGOT", "U/L", 8.0, 50.0),
+    ("URINALYSIS: PH", "no unit", 5.0, 8.0),
+]
+
+REGIONS = {
+    "North America": {"USA": ["New York", "Chicago", "Austin", "Seattle"], "Canada": ["Toronto", "Montreal"],
+                      "Mexico": ["Mexico City", "Monterrey"]},
+    "Europe": {"France": ["Paris", "Lyon"], "Germany": ["Berlin", "Munich"], "Spain": ["Madrid", "Barcelona"],
+               "UK": ["London", "Manchester"], "Norway": ["Oslo", "Bergen"]},
+    "Asia": {"Japan": ["Tokyo", "Osaka"], "Singapore": ["Singapore"], "Philippines": ["Manila", "Cebu"]},
+    "Oceania": {"Australia": ["Sydney", "Melbourne"], "New Zealand": ["Auckland"]},
+}
+COUNTRIES = [(country, region, cities) for region, countries in REGIONS.items() for country, cities in countries.items()]
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+               "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+               "Daniel", "Nancy", "Matthew", "Lisa", "Anthony", "Betty", "Mark", "Sandra", "Paul", "Ashley"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+              "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+              "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson"]
+STREETS = ["Main St", "Oak Ave", "Pine Rd", "Maple Dr", "Cedar Ln", "Elm St", "Lake View", "Hill Rd", "Park Ave"]
+CATEGORIES = [
+    ("Classic Cars", "Die-cast replicas of classic cars"),
+    ("Motorcycles", "Die-cast motorcycle models"),
+    ("Planes", "Scale models of aircraft"),
+    ("Ships", "Scale models of ships and boats"),
+    ("Trains", "Model trains and rolling stock"),
+    ("Trucks and Buses", "Die-cast trucks and buses"),
+    ("Vintage Cars", "Replicas of pre-war cars"),
+]
+PRODUCT_MAKERS = ["Ford", "Ferrari", "Harley", "Boeing", "Titanic", "Union Pacific", "Volvo", "Bugatti", "Ducati",
+                  "Airbus", "Porsche", "Chevrolet", "Mercedes", "Yamaha", "Lockheed", "Honda", "BMW", "Cessna"]
+PRODUCT_MODELS = ["Model A", "GT", "Roadster", "Cruiser", "Express", "Classic", "Sport", "Deluxe", "Mk II", "Custom"]
+
+
+def load_diagnoses(path):
+    """(code, description) pairs from the sample diagnoses file, or the built-in list."""
+    if not os.path.exists(path):
+        return FALLBACK_DIAGNOSES
+    pairs = set()
+    with open(path, encoding="utf-8-sig") as f:
+        next(f)
+        for line in f:
+            parts = line.rstrip("\r\n").split("\t")
+            if len(parts) >= 4 and parts[2]:
+                pairs.add((parts[2], parts[3]))
+    return sorted(pairs) or FALLBACK_DIAGNOSES
+
+
+def _choice(rng, options, size=None):
+    values, weights = options
+    picked = rng.choice(len(values), size=size, p=weights)
+    return values[picked] if size is None else [values[i] for i in picked]
+
+
+def _timestamps(ms):
+    """'YYYY-MM-DD HH:MM:SS.mmm' strings for epoch milliseconds, as in the sample files."""
+    return [s.replace("T", " ") for s in np.datetime_as_string(np.asarray(ms, dtype="datetime64[ms]"), unit="ms")]
+
+
+EPOCH_1930 = int(np.datetime64("1930-01-01", "ms").astype("int64"))
+DAY_MS = 86_400_000
+
+
+def patient_record(seed, index):
+    """Patient row fields and its admissions [(admission_id, start_ms, end_ms)], from its own generator."""
+    rng = np.random.default_rng([seed, PATIENT_STREAM, index])
+    patient_id = str(uuid.UUID(bytes=rng.bytes(16), version=4)).upper()
+    birth_ms = EPOCH_1930 + int(rng.integers(0, 60 * 365 * DAY_MS))
+    fields = [
+        patient_id,
+        _choice(rng, GENDERS),
+        _timestamps([birth_ms])[0],
+        _choice(rng, RACES),
+        _choice(rng, MARITAL_STATUSES),
+        _choice(rng, LANGUAGES),
+        f"{rng.uniform(0, 40):.2f}",
+    ]
+    admissions = []
+    start_ms = max(birth_ms + 18 * 365 * DAY_MS, EPOCH_1930 + int(rng.integers(50, 70) * 365 * DAY_MS))
+    for admission_id in range(1, _choice(rng, ADMISSIONS_PER_PATIENT) + 1):
+        start_ms += int(rng.integers(30, 2 * 365) * DAY_MS + rng.integers(0, DAY_MS))
+        end_ms = start_ms + int(rng.integers(1, 21) * DAY_MS + rng.integers(0, DAY_MS))
+        admissions.append((admission_id, start_ms, end_ms))
+        start_ms = end_ms
+    return fields, admissions
+
+
+class _TableWriter:
+    """Line writer for one output file that reports rows written when it is closed."""
+
+    def __init__(self, path, header, encoding="utf-8", newline="\n"):
+        self.path = path
+        self.newline = newline
+        self.rows = 0
+        self.start_time = time.time()
+        self.file = open(path, "w", encoding=encoding, newline="", buffering=1 << 20)
+        self.file.write("\t".join(header) + newline)
+
+    def write(self, fields):
+        self.file.write("\t".join(fields) + self.newline)
+        self.rows += 1
+
+    def write_lines(self, lines):
+        self.file.write(self.newline.join(lines) + self.newline)
+        self.rows += len(lines)
+
+    def close(self):
+        self.file.close()
+        elapsed = time.time() - self.start_time
+        size_mb = os.path.getsize(self.path) / 1e6
+        print(f"✅ Wrote {self.rows:,} rows ({size_mb:,.1f} MB) to {self.path} in {elapsed:.1f}s")
+
+
+def generate_ehr(out_dir, scale, seed, names, labs_per_admission, diagnoses):
+    """Write the requested EHR files, one patient at a time."""
+    writers = {
+        name: _TableWriter(os.path.join(out_dir, EHR_FILES[name]), EXPECTED_COLUMNS[name],
+                           encoding="utf-8-sig", newline="\r\n")
+        for name in names
+    }
+    lab_names = np.array([lab[0] for lab in LAB_TESTS], dtype=object)
+    lab_units = np.array([lab[1] for lab in LAB_TESTS], dtype=object)
+    lab_low = np.array([lab[2] for lab in LAB_TESTS])
+    lab_high = np.array([lab[3] for lab in LAB_TESTS])
+    patients = PATIENTS_PER_SCALE * scale
+    for index in range(patients):
+        fields, admissions = patient_record(seed, index)
+        patient_id = fields[0]
+        if "patients" in writers:
+            writers["patients"].write(fields)
+        if "admissions" in writers:
+            for admission_id, start_ms, end_ms in admissions:
+                writers["admissions"].write([patient_id, str(admission_id), *_timestamps([start_ms, end_ms])])
+        if "diagnoses" in writers:
+            rng = np.random.default_rng([seed, DIAGNOSIS_STREAM, index])
+            for admission_id, _, _ in admissions:
+                code, description = diagnoses[int(rng.integers(len(diagnoses)))]
+                writers["diagnoses"].write([patient_id, str(admission_id), code, description])
+        if "labs" in writers:
+            rng = np.random.default_rng([seed, LAB_STREAM, index])
+            for admission_id, start_ms, end_ms in admissions:
+                n = int(rng.poisson(labs_per_admission))
+                tests = rng.integers(len(LAB_TESTS), size=n)
+                # mostly in the typical range, with a tail either side
+                spread = lab_high[tests] - lab_low[tests]
+                values = np.round(np.abs(rng.normal(lab_low[tests] + spread / 2, spread / 3)), 1)
+                times = np.sort(rng.integers(start_ms, end_ms, size=n))
+                admission = str(admission_id)
+                writers["labs"].write_lines([
+                    f"{patient_id}\t{admission}\t{name}\t{value}\t{unit}\t{when}"
+                    for name, value, unit, when in zip(lab_names[tests], values.tolist(), lab_units[tests], _timestamps(times))
+                ])
+        if (index + 1) % 10_000 == 0:
+            print(f"  {index + 1:,} / {patients:,} patients")
+    for writer in writers.values():
+        writer.close()
+
+
+def customer_fields(i):
+    """Name, address, city, country and region for customer i (no state; derived from i)."""
+    first = FIRST_NAMES[i % len(FIRST_NAMES)]
+    last = LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    generation = i // (len(FIRST_NAMES) * len(LAST_NAMES))
+    if generation:
+        last = f"{last}-{generation}"  # keeps names unique, as the loader keys customers by name
+    country, region, cities = COUNTRIES[(i * 2654435761) % len(COUNTRIES)]
+    address = f"{1 + (i * 7919) % 9899} {STREETS[(i // 7) % len(STREETS)]}"
+    return f"{first} {last}", address, cities[(i // 13) % len(cities)], country, region
+
+
+def product_fields(j):
+    """Name, category, category description and unit price for product j."""
+    maker = PRODUCT_MAKERS[j % len(PRODUCT_MAKERS)]
+    model = PRODUCT_MODELS[(j // len(PRODUCT_MAKERS)) % len(PRODUCT_MODELS)]
+    series = j // (len(PRODUCT_MAKERS) * len(PRODUCT_MODELS))
+    year = 1930 + (j * 37) % 90
+    category, description = CATEGORIES[(j * 40503) % len(CATEGORIES)]
+    name = f"{year} {maker} {model}" + (f" Series {series + 1}" if series else "")
+    return name, category, description, f"{5 + (j * 7919) % 19500 / 100:.2f}"
+
+
+def generate_sales(out_dir, scale, seed, block_lines=10_000):
+    """Write data.csv a block of lines at a time; customers and products are derived from their index."""
+    writer = _TableWriter(
+        os.path.join(out_dir, SALES_FILE),
+        ["CustomerName", "CustomerAddress", "CustomerCity", "CustomerCountry", "CustomerRegion", "ProductName",
+         "ProductCategory", "ProductCategoryDescription", "ProductUnitPrice", "QuantityOrdered", "OrderDate"],
+    )
+    products = [product_fields(j) for j in range(PRODUCTS)]
+    customers = CUSTOMERS_PER_SCALE * scale
+    lines = SALES_LINES_PER_SCALE * scale
+    first_day = np.datetime64("2018-01-01", "D")
+    rng = np.random.default_rng([seed, SALES_STREAM])
+    for block_start in range(0, lines, block_lines):
+        n = min(block_lines, lines - block_start)
+        customer_ids = rng.integers(customers, size=n)
+        item_counts = rng.integers(1, 6, size=n)
+        total = int(item_counts.sum())
+        product_ids = rng.integers(PRODUCTS, size=total).tolist()
+        quantities = rng.integers(1, 10, size=total).tolist()
+        days = first_day + rng.integers(0, 6 * 365, size=total)
+        dates = [d.replace("-", "") for d in np.datetime_as_string(days)]
+        out = []
+        offset = 0
+        for customer_id, count in zip(customer_ids.tolist(), item_counts.tolist()):
+            items = range(offset, offset + count)
+            offset += count
+            item_products = [products[product_ids[k]] for k in items]
+            out.append("\t".join([
+                *customer_fields(customer_id),
+                ";".join(p[0] for p in item_products),
+                ";".join(p[1] for p in item_products),
+                ";".join(p[2] for p in item_products),
+                ";".join(p[3] for p in item_products),
+                ";".join(str(quantities[k]) for k in items),
+                ";".join(dates[k] for k in items),
+            ]))
+        writer.write_lines(out)
+        if (block_start // block_lines + 1) % 100 == 0:
+            print(f"  {block_start + n:,} / {lines:,} sales lines")
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1, help="size multiplier, 1..1000 (1 = the sample files)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="generated", help="output directory (created if missing)")
+    parser.add_argument("--only", nargs="+", choices=[*EHR_FILES, "sales"], help="generate just these files")
+    parser.add_argument("--labs-per-admission", type=int, default=LABS_PER_ADMISSION,
+                        help="average lab rows per admission")
+    args = parser.parse_args()
+    if not 1 <= args.scale <= 1000:
+        parser.error("--scale must be between 1 and 1000")
+
+    os.makedirs(args.out, exist_ok=True)
+    names = args.only or [*EHR_FILES, "sales"]
+    ehr_names = [name for name in EHR_FILES if name in names]
+    patients = PATIENTS_PER_SCALE * args.scale
+    print(f"Generating scale {args.scale} (seed {args.seed}) into {args.out}: "
+          f"{patients:,} patients, ~{math.ceil(patients * 3.7):,} admissions, "
+          f"{SALES_LINES_PER_SCALE * args.scale:,} sales lines")
+    if ehr_names:
+        sample = os.path.join(os.path.dirname(os.path.abspath(__file__)), EHR_FILES["diagnoses"])
+        generate_ehr(args.out, args.scale, args.seed, ehr_names, args.labs_per_admission, load_diagnoses(sample))
+    if "sales" in names:
+        generate_sales(args.out, args.scale, args.seed)
+
+
+if __name__ == "__main__":
+    main()
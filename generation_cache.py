@@ -0,0 +1,87 @@
+"""Persistent cache of natural-language-to-SQL generations for the Streamlit apps."""
+import hashlib
+import sqlite3
+import threading
+import time
+
+
+def normalize_question(question):
+    """Fold case, whitespace and trailing punctuation so trivially different wordings share a key."""
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+
+def schema_hash(schema_text):
+    return hashlib.sha256(schema_text.encode("utf-8")).hexdigest()[:16]
+
+
+class GenerationCache:
+    """
+    SQLite-backed cache of generated SQL.
+
+    Entries are keyed on (normalized question, schema hash, model, temperature),
+    so a schema or model change never serves stale SQL. The file survives app
+    restarts; entries older than ttl_seconds are ignored and the least recently
+    used ones are deleted once there are more than max_entries.
+    """
+
+    def __init__(self, path="sql_generation_cache.sqlite3", max_entries=5_000, ttl_seconds=7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS generations (
+                key        TEXT PRIMARY KEY,
+                question   TEXT NOT NULL,
+                model      TEXT NOT NULL,
+                sql        TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used  REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    @staticmethod
+    def key(question, schema_text, model, temperature):
+        parts = [normalize_question(question), schema_hash(schema_text), model, repr(temperature)]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, question, schema_text, model, temperature):
+        key = self.key(question, schema_text, model, temperature)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sql FROM generations WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE generations SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, question, schema_text, model, temperature, sql):
+        key = self.key(question, schema_text, model, temperature)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO generations (key, question, model, sql, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, question, model, sql, now, now),
+            )
+            self._db.execute("DELETE FROM generations WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._db.execute(
+                "DELETE FROM generations WHERE key IN ("
+                "SELECT key FROM generations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM generations")
+            self._db.commit()
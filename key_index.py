@@ -0,0 +1,92 @@
+"""Compact read-only str -> id maps for dimension lookups during large loads."""
+import numpy as np
+import pandas as pd
+
+# Separator for composite keys such as (first, last, countryid); never part of a loaded value
+KEY_SEP = "\x1f"
+
+
+def composite_key(*parts):
+    return KEY_SEP.join(str(part) for part in parts)
+
+
+def hash_keys(keys):
+    """64-bit hashes of a sequence of strings (pandas' vectorized SipHash)."""
+    return pd.util.hash_array(np.asarray(keys, dtype=object), categorize=False)
+
+
+class KeyIndex:
+    """
+    str -> int map stored as sorted 64-bit key hashes plus a parallel id array.
+
+    Costs 12-16 bytes per key instead of the few hundred a dict of str -> int
+    takes, and looks up whole arrays of keys with one searchsorted. Keys are
+    not kept, so two different keys with the same 64-bit hash would share an
+    entry; at 10M keys the chance of that is about 1 in 400,000. As with a
+    dict built in order, a repeated key maps to the id it was given last.
+    """
+
+    def __init__(self, hashes, ids):
+        self.hashes = hashes
+        self.ids = ids
+
+    @classmethod
+    def build(cls, pairs, chunk_size=100_000):
+        """Build from an iterable of (key, id) pairs, holding at most chunk_size keys at a time."""
+        hash_chunks = []
+        id_chunks = []
+        keys = []
+        ids = []
+        for key, id_ in pairs:
+            keys.append(key)
+            ids.append(id_)
+            if len(keys) >= chunk_size:
+                hash_chunks.append(hash_keys(keys))
+                id_chunks.append(np.asarray(ids, dtype="int64"))
+                keys, ids = [], []
+        if keys:
+            hash_chunks.append(hash_keys(keys))
+            id_chunks.append(np.asarray(ids, dtype="int64"))
+        if not hash_chunks:
+            return cls(np.array([], dtype="uint64"), np.array([], dtype="int64"))
+
+        hashes = np.concatenate(hash_chunks)
+        all_ids = np.concatenate(id_chunks)
+        del hash_chunks, id_chunks
+        order = np.argsort(hashes, kind="stable")
+        hashes = hashes[order]
+        all_ids = all_ids[order]
+        del order
+        # stable sort keeps insertion order within a run of equal hashes; keep the last
+        last = np.append(hashes[1:] != hashes[:-1], True)
+        ids = all_ids[last]
+        if len(ids) and ids.max() < 2**31 and ids.min() >= -2**31:
+            ids = ids.astype("int32")
+        return cls(hashes[last], ids)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    @property
+    def nbytes(self):
+        return self.hashes.nbytes + self.ids.nbytes
+
+    def lookup(self, keys):
+        """Ids for a sequence of keys as float64, NaN where a key is missing."""
+        wanted = hash_keys(keys)
+        # searching in sorted order walks the table once instead of jumping around it
+        order = np.argsort(wanted)
+        pos = np.empty(len(wanted), dtype="intp")
+        pos[order] = np.searchsorted(self.hashes, wanted[order])
+        pos[pos == len(self.hashes)] = 0
+        found = self.hashes[pos] == wanted if len(self.hashes) else np.zeros(len(wanted), dtype=bool)
+        result = np.full(len(wanted), np.nan)
+        result[found] = self.ids[pos[found]]
+        return result
+
+    def get(self, key, default=None):
+        value = self.lookup([key])[0]
+        return default if np.isnan(value) else int(value)
+
+    def __contains__(self, key):
+        return not np.isnan(self.lookup([key])[0])
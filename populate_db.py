@@ -1,11 +1,15 @@
 import os
+import hashlib
 import psycopg2
 from psycopg2 import extras
 import csv
 from pathlib import Path
 import time
+import argparse
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from utils import get_db_url
+from utils import get_db_url, mark_load_complete, build_summary_views
 
 
 STAGING_CREATE_SQL = """
@@ -25,6 +29,16 @@ DROP TABLE IF EXISTS stage_labs CASCADE;
 DROP TABLE IF EXISTS stage_diagnoses CASCADE;
 DROP TABLE IF EXISTS stage_admissions CASCADE;
 DROP TABLE IF EXISTS stage_patients CASCADE;
+DROP TABLE IF EXISTS etl_load_state CASCADE;
+
+-- What has been loaded from each source file, for incremental runs
+CREATE TABLE etl_load_state (
+    source          TEXT PRIMARY KEY,
+    byte_offset     BIGINT NOT NULL,
+    prefix_checksum TEXT NOT NULL,
+    watermark       TIMESTAMP,
+    loaded_at       TIMESTAMP NOT NULL DEFAULT now()
+);
 
 -- Staging tables
 CREATE TABLE stage_patients (
@@ -143,19 +157,27 @@ CREATE TABLE admission_lab_results (
 );
 """
 
+# "loader" selects how a file is staged: "copy" streams it through
+# COPY ... FROM STDIN, "batch" uses the older execute_batch INSERT path.
+# "chunk_bytes" lets parallel staging split a COPY file into byte ranges.
 FILES = {
     "patients": {
         "filename": "PatientCorePopulatedTable.txt",
+        "loader": "copy",
      },
     "admissions": {
         "filename": "AdmissionsCorePopulatedTable.txt",
+        "loader": "copy",
      },
     "diagnoses": {
         "filename": "AdmissionsDiagnosesCorePopulatedTable.txt",
+        "loader": "copy",
      },
     "labs": {
         "filename": "LabsCorePopulatedTable.txt",
         "batch_size": 100_000,
+        "loader": "copy",
+        "chunk_bytes": 128 * 1024 * 1024,
      }
 }
 
@@ -235,6 +257,750 @@ def load_tsv_to_stage(conn, filepath, stage_table, expected_columns, batch_size=
 
         cursor.close()
         print(f"Finished loading data into {stage_table}")
+        return total_count
+
+
+def read_tsv_header(filepath, expected_columns):
+    """Validate a TSV header and return (columns, byte offset of the first data row)."""
+    path = Path(filepath)
+    if not path.exists():
+        raise FileNotFoundError(f"Missing file: {filepath}")
+
+    with path.open("rb") as tsvfile:
+        raw = tsvfile.readline()
+    header = next(csv.reader([raw.decode("utf-8-sig")], delimiter='\t'), [])
+    missing = sorted(set(expected_columns) - set(header))
+    if missing:
+        raise ValueError(f"{filepath} missing expected columns: {missing}")
+    return header, len(raw)
+
+
+class _ByteRangeReader:
+    """File wrapper that stops reading at a fixed byte offset."""
+
+    def __init__(self, f, end):
+        self.f = f
+        self.end = end
+
+    def read(self, size=-1):
+        remaining = self.end - self.f.tell()
+        if remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        return self.f.read(size)
+
+
+def copy_range_to_stage(conn, filepath, stage_table, columns, start, end=None):
+    """COPY the rows in bytes [start, end) of a TSV file into a staging table."""
+    if end is None:
+        end = os.path.getsize(filepath)
+
+    # CSV format with a tab delimiter mirrors csv.DictReader's quoting rules
+    sql = (
+        f"COPY {stage_table} ({', '.join(columns)}) "
+        "FROM STDIN WITH (FORMAT csv, DELIMITER E'\\t')"
+    )
+    cursor = conn.cursor()
+    with open(filepath, "rb") as tsvfile:
+        tsvfile.seek(start)
+        cursor.copy_expert(sql, _ByteRangeReader(tsvfile, end), size=1 << 20)
+    conn.commit()
+    total_count = cursor.rowcount
+    cursor.close()
+    return total_count
+
+
+def copy_tsv_to_stage(conn, filepath, stage_table, expected_columns, batch_size=None):
+    """Stream a TSV file into a staging table with COPY ... FROM STDIN.
+
+    The header is read (and its BOM stripped) here so the column check matches
+    load_tsv_to_stage; the remaining bytes are handed to the server untouched.
+    Files carrying columns the staging table does not know about fall back to
+    load_tsv_to_stage.
+    """
+    header, data_offset = read_tsv_header(filepath, expected_columns)
+
+    extra = [c for c in header if c not in expected_columns]
+    if extra:
+        print(f"{filepath} has extra columns {extra}; using batch insert instead of COPY")
+        return load_tsv_to_stage(conn, filepath, stage_table, expected_columns, batch_size or 5_000)
+
+    cursor = conn.cursor()
+    cursor.execute(f"DELETE FROM {stage_table}")
+    conn.commit()
+    cursor.close()
+    print(f"Cleaned up rows from {stage_table}")
+
+    start_time = time.monotonic()
+    total_count = copy_range_to_stage(conn, filepath, stage_table, header, data_offset)
+    elapsed = time.monotonic() - start_time
+
+    rate = total_count / elapsed if elapsed > 0 else 0.0
+    print(f"Copied {total_count:,} rows into {stage_table} in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    return total_count
+
+
+STAGE_LOADERS = {
+    "copy": copy_tsv_to_stage,
+    "batch": load_tsv_to_stage,
+}
+
+
+def stage_file(conn, name):
+    """Load one FILES entry into its stage table using the configured loader."""
+    entry = FILES[name]
+    loader = STAGE_LOADERS[entry.get("loader", "batch")]
+    return loader(
+        conn,
+        entry["filename"],
+        f"stage_{name}",
+        EXPECTED_COLUMNS[name],
+        entry.get("batch_size", 5_000)
+    )
+
+
+def split_byte_ranges(filepath, start, chunk_bytes):
+    """Split bytes [start, EOF) of a file into ranges of ~chunk_bytes ending on line boundaries."""
+    size = os.path.getsize(filepath)
+    ranges = []
+    with open(filepath, "rb") as f:
+        pos = start
+        while pos < size:
+            end = min(pos + chunk_bytes, size)
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((pos, end))
+            pos = end
+    return ranges
+
+
+def _stage_task(task):
+    """Process-pool worker: stage one file or one byte range on its own connection."""
+    db_url, name, byte_range, label = task
+    start_time = time.monotonic()
+    conn = psycopg2.connect(db_url)
+    try:
+        if byte_range is None:
+            rows = stage_file(conn, name)
+        else:
+            columns, start, end = byte_range
+            rows = copy_range_to_stage(conn, FILES[name]["filename"], f"stage_{name}", columns, start, end)
+    finally:
+        conn.close()
+    elapsed = time.monotonic() - start_time
+    print(f"[{label}] staged {rows:,} rows in {elapsed:.2f}s", flush=True)
+    return label, rows, elapsed
+
+
+def stage_files_parallel(db_url, names, workers):
+    """
+    Load the given FILES entries through a process pool, one connection per task.
+
+    COPY entries with "chunk_bytes" are split into line-aligned byte ranges so a
+    single large file is loaded by several workers. Rows must not contain quoted
+    newlines for the split to be safe, which holds for the EHR extracts.
+    """
+    tasks = []
+    conn = psycopg2.connect(db_url)
+    cursor = conn.cursor()
+    for name in names:
+        entry = FILES[name]
+        filename = entry["filename"]
+        chunk_bytes = entry.get("chunk_bytes")
+        if entry.get("loader", "batch") == "copy" and chunk_bytes:
+            header, data_offset = read_tsv_header(filename, EXPECTED_COLUMNS[name])
+            if set(header) <= set(EXPECTED_COLUMNS[name]):
+                ranges = split_byte_ranges(filename, data_offset, chunk_bytes)
+                if len(ranges) > 1:
+                    cursor.execute(f"DELETE FROM stage_{name}")
+                    for i, (start, end) in enumerate(ranges):
+                        label = f"{name} {i + 1}/{len(ranges)}"
+                        tasks.append((end - start, (db_url, name, (header, start, end), label)))
+                    continue
+        tasks.append((os.path.getsize(filename), (db_url, name, None, name)))
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    # Start the biggest pieces first so they do not end up as the long tail
+    tasks.sort(key=lambda t: t[0], reverse=True)
+    print(f"Staging {len(tasks)} task(s) with {workers} worker(s)")
+
+    total_rows = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_stage_task, task) for _, task in tasks]
+        for done, future in enumerate(as_completed(futures), start=1):
+            label, rows, elapsed = future.result()
+            total_rows += rows
+            print(f"Finished {done}/{len(futures)} ({label}); total staged: {total_rows:,}")
+    return total_rows
+
+
+# Replaces the plain lab tables from STAGING_CREATE_SQL when --partition is used.
+# stage_labs keeps a DEFAULT partition for rows with a missing LabDateTime, and
+# admission_lab_results one for rows of periods already detached to the archive.
+PARTITIONED_LABS_SQL = """
+DROP TABLE IF EXISTS admission_lab_results CASCADE;
+DROP TABLE IF EXISTS stage_labs CASCADE;
+
+CREATE TABLE stage_labs (
+    PatientID                              TEXT,
+    AdmissionID                            TEXT,
+    LabName                                TEXT,
+    LabValue                               TEXT,
+    LabUnits                               TEXT,
+    LabDateTime                            TIMESTAMP
+) PARTITION BY RANGE (LabDateTime);
+
+CREATE TABLE stage_labs_default PARTITION OF stage_labs DEFAULT;
+
+CREATE TABLE admission_lab_results (
+    patient_id    TEXT NOT NULL,
+    admission_id  INTEGER NOT NULL,
+    lab_test_id   INTEGER NOT NULL,
+    lab_value     REAL,
+    lab_datetime  TIMESTAMP NOT NULL,
+    FOREIGN KEY (patient_id, admission_id) REFERENCES admissions(patient_id, admission_id),
+    FOREIGN KEY (lab_test_id) REFERENCES lab_tests(lab_test_id),
+    UNIQUE (patient_id, admission_id, lab_test_id, lab_datetime)
+) PARTITION BY RANGE (lab_datetime);
+
+CREATE TABLE admission_lab_results_default PARTITION OF admission_lab_results DEFAULT;
+"""
+
+# Detached lab partitions are renamed with this prefix so the query apps skip them
+ARCHIVE_PREFIX = "archive_lab_results_"
+
+LAB_FACTS_SQL = """
+    INSERT INTO {target} (
+        patient_id, admission_id, lab_test_id, lab_value, lab_datetime
+    )
+    SELECT
+        s.PatientID,
+        s.AdmissionID::INTEGER,
+        lt.lab_test_id,
+        NULLIF(s.LabValue, '')::REAL,
+        s.LabDateTime
+    FROM {source} s
+    JOIN lab_tests lt ON lt.lab_name = s.LabName
+    ON CONFLICT (patient_id, admission_id, lab_test_id, lab_datetime) DO NOTHING;
+"""
+
+
+def period_suffix(period, granularity):
+    return f"p{period.year}" if granularity == "year" else f"p{period.year}{period.month:02d}"
+
+
+def parse_period_suffix(name):
+    """Period start encoded in a partition name (..._p2010 or ..._p201003), or None."""
+    suffix = name.rsplit("_p", 1)[-1]
+    if not suffix.isdigit():
+        return None
+    if len(suffix) == 4:
+        return date(int(suffix), 1, 1), "year"
+    if len(suffix) == 6:
+        return date(int(suffix[:4]), int(suffix[4:]), 1), "month"
+    return None
+
+
+def period_end(period, granularity):
+    if granularity == "year":
+        return date(period.year + 1, 1, 1)
+    return date(period.year + period.month // 12, period.month % 12 + 1, 1)
+
+
+def scan_lab_periods(filepath, granularity, start=0):
+    """
+    Periods (first day of each year or month) present in a labs TSV file.
+
+    One sequential pass that only looks at the LabDateTime prefix of each line,
+    so partitions exist before COPY routes rows into them. `start` skips the
+    bytes an incremental run will not stage again.
+    """
+    header, data_offset = read_tsv_header(filepath, EXPECTED_COLUMNS["labs"])
+    index = header.index("LabDateTime")
+    width = 4 if granularity == "year" else 7
+    keys = set()
+    with open(filepath, "rb") as f:
+        f.seek(max(start, data_offset))
+        for line in f:
+            fields = line.split(b"\t")
+            if len(fields) > index:
+                keys.add(fields[index][:width])
+
+    periods = set()
+    for key in keys:
+        try:
+            text = key.decode("ascii")
+            periods.add(date(int(text[:4]), int(text[5:7]) if granularity == "month" else 1, 1))
+        except ValueError:
+            continue  # blank or malformed timestamps land in stage_labs_default
+    return sorted(periods)
+
+
+def lab_partitions(conn, parent):
+    """Names of the partitions currently attached to a table."""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        ORDER BY c.relname
+    """, (parent,))
+    names = [row[0] for row in cur.fetchall()]
+    cur.close()
+    return names
+
+
+def lab_partition_granularity(conn):
+    """'year' or 'month' when admission_lab_results is partitioned, else None."""
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('admission_lab_results')")
+    partitioned = cur.fetchone() is not None
+    cur.close()
+    if not partitioned:
+        return None
+    for name in lab_partitions(conn, "admission_lab_results"):
+        parsed = parse_period_suffix(name)
+        if parsed:
+            return parsed[1]
+    return None
+
+
+def ensure_lab_partitions(conn, granularity, periods):
+    """
+    Create the stage and fact partitions for any of `periods` that do not exist yet.
+
+    Periods detached to the archive get no new fact partition, which would stop
+    attach_lab_partition from bringing the archived one back; their rows land
+    in admission_lab_results_default instead.
+    """
+    cur = conn.cursor()
+    cur.execute("CREATE TABLE IF NOT EXISTS admission_lab_results_default PARTITION OF admission_lab_results DEFAULT")
+    created = 0
+    archived = 0
+    for period in periods:
+        suffix = period_suffix(period, granularity)
+        bounds = f"FROM ('{period.isoformat()}') TO ('{period_end(period, granularity).isoformat()}')"
+        for parent in ("stage_labs", "admission_lab_results"):
+            cur.execute("SELECT to_regclass(%s), to_regclass(%s)", (f"{parent}_{suffix}", ARCHIVE_PREFIX + suffix))
+            existing, archive = cur.fetchone()
+            if parent == "admission_lab_results" and archive is not None:
+                archived += 1
+            elif existing is None:
+                cur.execute(f"CREATE TABLE {parent}_{suffix} PARTITION OF {parent} FOR VALUES {bounds}")
+                created += 1
+    conn.commit()
+    cur.close()
+    print(f"{created} lab partition(s) created for {len(periods)} {granularity} period(s)")
+    if archived:
+        print(f"{archived} archived period(s) load into admission_lab_results_default")
+
+
+def _lab_partition_task(task):
+    """Process-pool worker: load one stage_labs partition into its fact partition."""
+    db_url, source, target = task
+    start_time = time.monotonic()
+    conn = psycopg2.connect(db_url)
+    try:
+        cur = conn.cursor()
+        cur.execute(LAB_FACTS_SQL.format(source=source, target=target))
+        rows = cur.rowcount
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+    elapsed = time.monotonic() - start_time
+    print(f"[{target}] loaded {rows:,} rows in {elapsed:.2f}s", flush=True)
+    return target, rows, elapsed
+
+
+def load_lab_partitions_parallel(db_url, workers):
+    """
+    Load lab results partition by partition through a process pool.
+
+    Each non-empty stage_labs partition is inserted straight into the fact
+    partition for the same period, so an incremental run only touches the
+    periods its new rows fall in. Rows in stage_labs_default, and rows of
+    periods whose fact partition was detached, go through the parent table.
+    """
+    conn = psycopg2.connect(db_url)
+    cur = conn.cursor()
+    targets = set(lab_partitions(conn, "admission_lab_results"))
+    tasks = []
+    for source in lab_partitions(conn, "stage_labs"):
+        cur.execute(f"SELECT EXISTS (SELECT 1 FROM {source})")
+        if not cur.fetchone()[0]:
+            continue
+        target = "admission_lab_results_" + source[len("stage_labs_"):]
+        if target not in targets or target == "admission_lab_results_default":
+            target = "admission_lab_results"
+        tasks.append((db_url, source, target))
+    cur.close()
+    conn.close()
+
+    print(f"Loading {len(tasks)} lab partition(s) with {workers} worker(s)")
+    total_rows = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_lab_partition_task, task) for task in tasks]
+        for future in as_completed(futures):
+            _, rows, _ = future.result()
+            total_rows += rows
+    print(f"Lab results populated: {total_rows:,} new rows")
+    return total_rows
+
+
+def detach_lab_partitions(conn, before):
+    """
+    Detach fact partitions whose whole period ends on or before `before`.
+
+    Detached partitions keep their rows and are renamed with ARCHIVE_PREFIX so
+    they can be dropped, dumped or re-attached with attach_lab_partition.
+    """
+    cur = conn.cursor()
+    detached = []
+    for name in lab_partitions(conn, "admission_lab_results"):
+        parsed = parse_period_suffix(name)
+        if parsed is None or period_end(*parsed) > before:
+            continue
+        archive = ARCHIVE_PREFIX + period_suffix(*parsed)
+        cur.execute(f"ALTER TABLE admission_lab_results DETACH PARTITION {name}")
+        cur.execute(f"ALTER TABLE {name} RENAME TO {archive}")
+        detached.append(archive)
+    conn.commit()
+    cur.close()
+    print(f"Detached {len(detached)} lab partition(s): {', '.join(detached) or '-'}")
+    return detached
+
+
+def attach_lab_partition(conn, archive):
+    """
+    Re-attach a partition previously detached by detach_lab_partitions.
+
+    Rows loaded for its period while it was archived are moved out of the
+    default partition first, since the attach fails while they are there.
+    """
+    if not archive.startswith(ARCHIVE_PREFIX):
+        archive = ARCHIVE_PREFIX + archive
+    parsed = parse_period_suffix(archive)
+    if parsed is None:
+        raise ValueError(f"Cannot tell the period of {archive}")
+    period, granularity = parsed
+    name = f"admission_lab_results_{period_suffix(period, granularity)}"
+    bounds = {"start": period, "end": period_end(period, granularity)}
+    cur = conn.cursor()
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM admission_lab_results_default
+            WHERE lab_datetime >= %(start)s AND lab_datetime < %(end)s
+            RETURNING patient_id, admission_id, lab_test_id, lab_value, lab_datetime
+        )
+        INSERT INTO {archive} (patient_id, admission_id, lab_test_id, lab_value, lab_datetime)
+        SELECT * FROM moved
+        ON CONFLICT (patient_id, admission_id, lab_test_id, lab_datetime) DO NOTHING
+    """, bounds)
+    if cur.rowcount:
+        print(f"Moved {cur.rowcount:,} row(s) from admission_lab_results_default into {archive}")
+    cur.execute(f"ALTER TABLE {archive} RENAME TO {name}")
+    cur.execute(
+        f"ALTER TABLE admission_lab_results ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{period.isoformat()}') TO ('{period_end(period, granularity).isoformat()}')"
+    )
+    conn.commit()
+    cur.close()
+    print(f"Attached {name}")
+
+
+# Keys and FKs the fast fact load adds back once the rows are in: (table, name, definition).
+# Unique keys come first so the FK checks that follow can use their indexes.
+FACT_CONSTRAINTS = [
+    ("admission_primary_diagnoses", "admission_primary_diagnoses_pkey",
+     "PRIMARY KEY (patient_id, admission_id)"),
+    ("admission_lab_results", "admission_lab_results_key",
+     "UNIQUE (patient_id, admission_id, lab_test_id, lab_datetime)"),
+    ("admission_primary_diagnoses", "admission_primary_diagnoses_admission_fkey",
+     "FOREIGN KEY (patient_id, admission_id) REFERENCES admissions(patient_id, admission_id)"),
+    ("admission_primary_diagnoses", "admission_primary_diagnoses_diagnosis_code_fkey",
+     "FOREIGN KEY (diagnosis_code) REFERENCES diagnosis_codes(diagnosis_code)"),
+    ("admission_lab_results", "admission_lab_results_admission_fkey",
+     "FOREIGN KEY (patient_id, admission_id) REFERENCES admissions(patient_id, admission_id)"),
+    ("admission_lab_results", "admission_lab_results_lab_test_fkey",
+     "FOREIGN KEY (lab_test_id) REFERENCES lab_tests(lab_test_id)"),
+]
+
+
+# Secondary indexes built once the data is in: (name, table, method, columns).
+# BRIN suits the timestamp columns because rows arrive roughly in time order.
+SECONDARY_INDEXES = [
+    ("idx_lab_results_lab_test", "admission_lab_results", "btree", "lab_test_id"),
+    ("brin_lab_results_lab_datetime", "admission_lab_results", "brin", "lab_datetime"),
+    ("brin_admissions_start", "admissions", "brin", "admission_start"),
+    ("idx_primary_diagnoses_code", "admission_primary_diagnoses", "btree", "diagnosis_code"),
+    ("idx_patients_gender", "patients", "btree", "patient_gender"),
+    ("idx_patients_race", "patients", "btree", "patient_race"),
+    ("idx_patients_marital_status", "patients", "btree", "patient_marital_status"),
+    ("idx_patients_language", "patients", "btree", "patient_language"),
+    ("idx_lab_tests_unit", "lab_tests", "btree", "unit_id"),
+]
+
+
+# Pre-aggregated views for the common analytics questions: (name, SELECT, unique key).
+# Built after each load; the query app points the model at them first.
+SUMMARY_VIEWS = [
+    ("mv_patient_demographics", """
+        SELECT
+            COALESCE(g.gender_desc, 'Unknown') AS gender_desc,
+            COALESCE(r.race_desc, 'Unknown') AS race_desc,
+            COALESCE(m.marital_status_desc, 'Unknown') AS marital_status_desc,
+            COALESCE(l.language_desc, 'Unknown') AS language_desc,
+            count(*) AS patient_count,
+            avg(EXTRACT(YEAR FROM AGE(p.patient_dob))) AS avg_age_years,
+            avg(p.patient_population_pct_below_poverty) AS avg_pct_below_poverty
+        FROM patients p
+        LEFT JOIN genders g ON g.gender_id = p.patient_gender
+        LEFT JOIN races r ON r.race_id = p.patient_race
+        LEFT JOIN marital_statuses m ON m.marital_status_id = p.patient_marital_status
+        LEFT JOIN languages l ON l.language_id = p.patient_language
+        GROUP BY 1, 2, 3, 4
+    """, ["gender_desc", "race_desc", "marital_status_desc", "language_desc"]),
+    ("mv_admissions_monthly", """
+        SELECT
+            date_trunc('month', admission_start)::DATE AS admission_month,
+            count(*) AS admission_count,
+            count(admission_end) AS discharged_count,
+            sum(EXTRACT(EPOCH FROM (admission_end - admission_start)) / 86400) AS total_los_days,
+            avg(EXTRACT(EPOCH FROM (admission_end - admission_start)) / 86400) AS avg_los_days
+        FROM admissions
+        GROUP BY 1
+    """, ["admission_month"]),
+    ("mv_diagnosis_los", """
+        SELECT
+            d.diagnosis_code,
+            d.diagnosis_description,
+            count(*) AS admission_count,
+            avg(EXTRACT(EPOCH FROM (a.admission_end - a.admission_start)) / 86400) AS avg_los_days,
+            min(EXTRACT(EPOCH FROM (a.admission_end - a.admission_start)) / 86400) AS min_los_days,
+            max(EXTRACT(EPOCH FROM (a.admission_end - a.admission_start)) / 86400) AS max_los_days
+        FROM admission_primary_diagnoses pd
+        JOIN admissions a ON a.patient_id = pd.patient_id AND a.admission_id = pd.admission_id
+        JOIN diagnosis_codes d ON d.diagnosis_code = pd.diagnosis_code
+        GROUP BY d.diagnosis_code, d.diagnosis_description
+    """, ["diagnosis_code"]),
+    ("mv_lab_daily_stats", """
+        SELECT
+            lt.lab_test_id,
+            lt.lab_name,
+            u.unit_string,
+            r.lab_datetime::DATE AS lab_date,
+            count(*) AS result_count,
+            avg(r.lab_value) AS avg_value,
+            min(r.lab_value) AS min_value,
+            max(r.lab_value) AS max_value
+        FROM admission_lab_results r
+        JOIN lab_tests lt ON lt.lab_test_id = r.lab_test_id
+        JOIN lab_units u ON u.unit_id = lt.unit_id
+        GROUP BY lt.lab_test_id, lt.lab_name, u.unit_string, r.lab_datetime::DATE
+    """, ["lab_test_id", "lab_date"]),
+]
+
+
+# Date column per stage table used as the incremental high-water mark
+WATERMARK_COLUMNS = {
+    "admissions": "AdmissionStartDate",
+    "labs": "LabDateTime",
+}
+
+# When a source file was rewritten rather than appended to, these drop the
+# staged rows an earlier load already covered
+DELTA_PRUNE_SQL = {
+    "admissions": """
+        DELETE FROM stage_admissions s
+        USING admissions a
+        WHERE s.AdmissionStartDate <= %(watermark)s
+          AND a.patient_id = s.PatientID
+          AND a.admission_id = s.AdmissionID::INTEGER
+          AND a.admission_end IS NOT DISTINCT FROM s.AdmissionEndDate
+    """,
+    "labs": "DELETE FROM stage_labs WHERE LabDateTime <= %(watermark)s",
+}
+
+
+# Tables each FILES entry writes to, used to skip refreshing summary views an
+# incremental run left untouched
+LOADED_TABLES = {
+    "patients": ["genders", "races", "marital_statuses", "languages", "patients"],
+    "admissions": ["admissions"],
+    "diagnoses": ["diagnosis_codes", "admission_primary_diagnoses"],
+    "labs": ["lab_units", "lab_tests", "admission_lab_results"],
+}
+
+def file_checksums(filepath, prefix_end, end):
+    """Return SHA-256 hex digests of bytes [0, prefix_end) and [0, end) in one read."""
+    digest = hashlib.sha256()
+    prefix_checksum = digest.hexdigest() if prefix_end == 0 else None
+    pos = 0
+    with open(filepath, "rb") as f:
+        while pos < end:
+            want = min(1 << 20, end - pos)
+            if prefix_checksum is None:
+                want = min(want, prefix_end - pos)
+            block = f.read(want)
+            if not block:
+                break
+            digest.update(block)
+            pos += len(block)
+            if prefix_checksum is None and pos == prefix_end:
+                prefix_checksum = digest.hexdigest()
+    return prefix_checksum, digest.hexdigest()
+
+
+def get_load_state(conn, name):
+    cur = conn.cursor()
+    cur.execute("SELECT byte_offset, prefix_checksum, watermark FROM etl_load_state WHERE source = %s", (name,))
+    row = cur.fetchone()
+    cur.close()
+    return row
+
+
+def save_load_state(conn, name, byte_offset, prefix_checksum, watermark):
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO etl_load_state (source, byte_offset, prefix_checksum, watermark, loaded_at)
+        VALUES (%s, %s, %s, %s, now())
+        ON CONFLICT (source) DO UPDATE SET
+            byte_offset = EXCLUDED.byte_offset,
+            prefix_checksum = EXCLUDED.prefix_checksum,
+            watermark = GREATEST(etl_load_state.watermark, EXCLUDED.watermark),
+            loaded_at = EXCLUDED.loaded_at;
+    """, (name, byte_offset, prefix_checksum, watermark))
+    conn.commit()
+    cur.close()
+
+
+def stage_watermark(conn, name):
+    """Latest source timestamp currently in a stage table, or None."""
+    column = WATERMARK_COLUMNS.get(name)
+    if column is None:
+        return None
+    cur = conn.cursor()
+    cur.execute(f"SELECT max({column}) FROM stage_{name}")
+    watermark = cur.fetchone()[0]
+    cur.close()
+    return watermark
+
+
+def file_snapshot(name):
+    """(size, SHA-256 of those bytes) of a FILES entry, taken before a full load stages it."""
+    filename = FILES[name]["filename"]
+    size = os.path.getsize(filename)
+    return size, file_checksums(filename, 0, size)[1]
+
+
+def delta_plan(conn, name):
+    """
+    Decide what a delta load of a FILES entry stages, before staging starts.
+
+    Returns (start, size, checksum). size and checksum describe the file as it
+    is now and become its next load state. start is the offset the previous
+    load stopped at, provided the bytes before it still match their checksum,
+    end on a line and belong to a COPY file whose rows can be copied from
+    there; otherwise it is None and the file is restaged whole. The old prefix
+    and the whole file are hashed in the same read.
+    """
+    entry = FILES[name]
+    filename = entry["filename"]
+    size = os.path.getsize(filename)
+    state = get_load_state(conn, name)
+    old_offset, old_checksum, _ = state if state else (0, None, None)
+    if old_offset > size:
+        old_offset, old_checksum = 0, None
+    prefix_checksum, checksum = file_checksums(filename, old_offset, size)
+
+    start = old_offset if prefix_checksum == old_checksum else None
+    if start:
+        with open(filename, "rb") as f:
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                start = None
+    if start is not None and start < size:
+        header, _ = read_tsv_header(filename, EXPECTED_COLUMNS[name])
+        if entry.get("loader", "batch") != "copy" or not set(header) <= set(EXPECTED_COLUMNS[name]):
+            start = None
+    return start, size, checksum
+
+
+def stage_file_delta(conn, name, plan=None):
+    """
+    Stage only what is new in a FILES entry since its recorded load state.
+
+    A file whose previously loaded bytes are unchanged is treated as appended
+    to, and only the bytes after the old offset are copied. Any other change
+    restages the whole file and prunes rows at or below the watermark that are
+    already loaded. `plan` is a delta_plan taken earlier; without one it is
+    taken here. Returns (rows staged, new load state to save).
+    """
+    filename = FILES[name]["filename"]
+    stage_table = f"stage_{name}"
+    start, size, checksum = plan or delta_plan(conn, name)
+
+    cur = conn.cursor()
+    if start is not None:
+        cur.execute(f"DELETE FROM {stage_table}")
+        conn.commit()
+        if start == size:
+            rows = 0
+        else:
+            header, data_offset = read_tsv_header(filename, EXPECTED_COLUMNS[name])
+            rows = copy_range_to_stage(conn, filename, stage_table, header, max(start, data_offset), size)
+        print(f"{filename}: {rows:,} appended rows staged")
+    else:
+        state = get_load_state(conn, name)
+        watermark = state[2] if state else None
+        rows = stage_file(conn, name)
+        if watermark is not None and name in DELTA_PRUNE_SQL:
+            cur.execute(DELTA_PRUNE_SQL[name], {"watermark": watermark})
+            rows -= cur.rowcount
+            conn.commit()
+            print(f"{filename}: rewritten; {rows:,} rows left after pruning to watermark {watermark}")
+    cur.close()
+
+    return rows, (size, checksum, stage_watermark(conn, name))
+
+
+def _stage_delta_task(task):
+    """Process-pool worker: stage_file_delta for one FILES entry on its own connection."""
+    db_url, name, plan = task
+    start_time = time.monotonic()
+    conn = psycopg2.connect(db_url)
+    try:
+        rows, state = stage_file_delta(conn, name, plan)
+    finally:
+        conn.close()
+    elapsed = time.monotonic() - start_time
+    print(f"[{name}] staged {rows:,} new rows in {elapsed:.2f}s", flush=True)
+    return name, rows, state
+
+
+def stage_file_deltas_parallel(db_url, plans, workers):
+    """
+    Run stage_file_delta through a process pool for each {name: delta_plan} entry.
+
+    Returns ({name: rows staged}, {name: load state}).
+    """
+    print(f"Staging {len(plans)} delta(s) with {workers} worker(s)")
+    staged_rows = {}
+    states = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_stage_delta_task, (db_url, name, plan)) for name, plan in plans.items()]
+        for future in as_completed(futures):
+            name, rows, state = future.result()
+            staged_rows[name] = rows
+            states[name] = state
+    return staged_rows, states
 
 
 def build_dimensions(conn):
@@ -304,16 +1070,34 @@ def build_dimensions(conn):
     print("Dimension tables populated")
 
 
-def load_entities(conn):
+def load_entities(conn, upsert=False):
+    """Load patients and admissions from staging; upsert=True overwrites changed rows."""
     cur = conn.cursor()
+
+    if upsert:
+        patient_distinct = "DISTINCT ON (s.PatientID)"
+        patient_conflict = """DO UPDATE SET
+            patient_gender = EXCLUDED.patient_gender,
+            patient_dob = EXCLUDED.patient_dob,
+            patient_race = EXCLUDED.patient_race,
+            patient_marital_status = EXCLUDED.patient_marital_status,
+            patient_language = EXCLUDED.patient_language,
+            patient_population_pct_below_poverty = EXCLUDED.patient_population_pct_below_poverty"""
+        admission_distinct = "DISTINCT ON (s.PatientID, s.AdmissionID::INTEGER)"
+        admission_conflict = """DO UPDATE SET
+            admission_start = EXCLUDED.admission_start,
+            admission_end = EXCLUDED.admission_end"""
+    else:
+        patient_distinct = admission_distinct = ""
+        patient_conflict = admission_conflict = "DO NOTHING"
     
     # Patients
-    cur.execute("""
+    cur.execute(f"""
         INSERT INTO patients (
             patient_id, patient_gender, patient_dob, patient_race,
             patient_marital_status, patient_language, patient_population_pct_below_poverty
         )
-        SELECT
+        SELECT {patient_distinct}
             s.PatientID,
             g.gender_id,
             s.PatientDateOfBirth,
@@ -326,19 +1110,19 @@ def load_entities(conn):
         LEFT JOIN races r ON r.race_desc = s.PatientRace
         LEFT JOIN marital_statuses m ON m.marital_status_desc = s.PatientMaritalStatus
         LEFT JOIN languages l ON l.language_desc = s.PatientLanguage
-        ON CONFLICT (patient_id) DO NOTHING;
+        ON CONFLICT (patient_id) {patient_conflict};
     """)
     
     # Admissions
-    cur.execute("""
+    cur.execute(f"""
         INSERT INTO admissions (patient_id, admission_id, admission_start, admission_end)
-        SELECT
+        SELECT {admission_distinct}
             s.PatientID,
             s.AdmissionID::INTEGER,
             s.AdmissionStartDate,
             s.AdmissionEndDate
         FROM stage_admissions s
-        ON CONFLICT (patient_id, admission_id) DO NOTHING;
+        ON CONFLICT (patient_id, admission_id) {admission_conflict};
     """)
     
     conn.commit()
@@ -346,69 +1130,223 @@ def load_entities(conn):
     print("Entity tables populated")
 
 
-def build_facts(conn):
+def build_facts(conn, upsert=False, labs=True):
+    """Load fact tables from staging; upsert=True overwrites changed diagnoses.
+
+    Lab results are append-only, so they always skip rows already loaded.
+    labs=False leaves them to load_lab_partitions_parallel.
+    """
     cur = conn.cursor()
+
+    if upsert:
+        diagnosis_distinct = "DISTINCT ON (s.PatientID, s.AdmissionID::INTEGER)"
+        diagnosis_conflict = "DO UPDATE SET diagnosis_code = EXCLUDED.diagnosis_code"
+    else:
+        diagnosis_distinct = ""
+        diagnosis_conflict = "DO NOTHING"
     
     # Primary diagnoses
-    cur.execute("""
+    cur.execute(f"""
         INSERT INTO admission_primary_diagnoses (patient_id, admission_id, diagnosis_code)
-        SELECT
+        SELECT {diagnosis_distinct}
             s.PatientID,
             s.AdmissionID::INTEGER,
             s.PrimaryDiagnosisCode
         FROM stage_diagnoses s
         JOIN diagnosis_codes d ON d.diagnosis_code = s.PrimaryDiagnosisCode
-        ON CONFLICT (patient_id, admission_id) DO NOTHING;
+        ON CONFLICT (patient_id, admission_id) {diagnosis_conflict};
     """)
     
     # Lab results
+    if labs:
+        cur.execute(LAB_FACTS_SQL.format(source="stage_labs", target="admission_lab_results"))
+    
+    conn.commit()
+    cur.close()
+    print("Fact tables populated")
+
+
+def build_facts_fast(conn, maintenance_work_mem="512MB"):
+    """
+    Full-load variant of build_facts that defers key and FK checks.
+
+    The fact tables are stripped of their PK/UNIQUE/FK constraints, loaded with
+    DISTINCT ON dedup instead of ON CONFLICT, and FACT_CONSTRAINTS are added
+    afterwards, so each key index is built once and each FK validated in one
+    pass. Only meant for freshly created (empty) fact tables.
+    """
+    cur = conn.cursor()
+    fact_tables = sorted({table for table, _, _ in FACT_CONSTRAINTS})
+    for table in fact_tables:
+        cur.execute("""
+            SELECT conname FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f')
+        """, (table,))
+        for (conname,) in cur.fetchall():
+            cur.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{conname}"')
+    conn.commit()
+
+    start_time = time.monotonic()
+    cur.execute("""
+        INSERT INTO admission_primary_diagnoses (patient_id, admission_id, diagnosis_code)
+        SELECT DISTINCT ON (s.PatientID, s.AdmissionID::INTEGER)
+            s.PatientID,
+            s.AdmissionID::INTEGER,
+            s.PrimaryDiagnosisCode
+        FROM stage_diagnoses s
+        JOIN diagnosis_codes d ON d.diagnosis_code = s.PrimaryDiagnosisCode;
+    """)
     cur.execute("""
         INSERT INTO admission_lab_results (
             patient_id, admission_id, lab_test_id, lab_value, lab_datetime
         )
-        SELECT
+        SELECT DISTINCT ON (s.PatientID, s.AdmissionID::INTEGER, lt.lab_test_id, s.LabDateTime)
             s.PatientID,
             s.AdmissionID::INTEGER,
             lt.lab_test_id,
             NULLIF(s.LabValue, '')::REAL,
             s.LabDateTime
         FROM stage_labs s
-        JOIN lab_tests lt ON lt.lab_name = s.LabName
-        ON CONFLICT (patient_id, admission_id, lab_test_id, lab_datetime) DO NOTHING;
+        JOIN lab_tests lt ON lt.lab_name = s.LabName;
     """)
-    
     conn.commit()
+    print(f"Fact rows loaded without constraints in {time.monotonic() - start_time:.2f}s")
+
+    cur.execute("SET maintenance_work_mem = %s", (maintenance_work_mem,))
+    for table, name, definition in FACT_CONSTRAINTS:
+        start_time = time.monotonic()
+        cur.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+        conn.commit()
+        print(f"  {name:<48} {time.monotonic() - start_time:8.2f}s")
+
+    # Verify every constraint is back and validated before anything relies on it
+    cur.execute("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = ANY(%s::regclass[]) AND convalidated
+    """, (fact_tables,))
+    present = {row[0] for row in cur.fetchall()}
+    missing = [name for _, name, _ in FACT_CONSTRAINTS if name not in present]
+    if missing:
+        raise RuntimeError(f"Fact constraints missing after fast load: {missing}")
+    for table in fact_tables:
+        cur.execute(f"SELECT count(*) FROM {table}")
+        print(f"  {table}: {cur.fetchone()[0]:,} rows")
+
+    cur.close()
+    print("Fact tables populated (constraints added after load)")
+
+
+def build_indexes(conn, maintenance_work_mem="512MB"):
+    """Create SECONDARY_INDEXES that do not exist yet, ANALYZE the tables and report timings."""
+    cur = conn.cursor()
+    cur.execute("SET maintenance_work_mem = %s", (maintenance_work_mem,))
+
+    timings = []
+    for name, table, method, columns in SECONDARY_INDEXES:
+        start_time = time.monotonic()
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING {method} ({columns})")
+        conn.commit()
+        timings.append((name, time.monotonic() - start_time))
+
+    tables = sorted({table for _, table, _, _ in SECONDARY_INDEXES} | {"admissions", "patients"})
+    start_time = time.monotonic()
+    for table in tables:
+        cur.execute(f"ANALYZE {table}")
+    conn.commit()
+    timings.append(("ANALYZE", time.monotonic() - start_time))
     cur.close()
-    print("Fact tables populated")
+
+    for name, elapsed in timings:
+        print(f"  {name:<32} {elapsed:8.2f}s")
+    print("Indexes built and statistics updated")
 
 
 # Main execution
 if __name__ == "__main__":
-    
+    parser = argparse.ArgumentParser(description="Load the EHR TSV extracts into the star schema")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="parallel staging processes (one per file for --incremental); 1 loads the files sequentially")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep existing tables and load only rows new since the last run")
+    parser.add_argument("--fast-facts", action="store_true",
+                        help="load fact tables without constraints and add them afterwards (full loads only)")
+    parser.add_argument("--partition", choices=["year", "month"],
+                        help="range-partition the lab tables by lab_datetime (full loads only)")
+    parser.add_argument("--detach-before", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="after loading, detach lab partitions that end on or before this date")
+    parser.add_argument("--attach", nargs="+", default=[], metavar="PERIOD",
+                        help="re-attach archived lab partitions (e.g. p2010 or archive_lab_results_p2010)")
+    args = parser.parse_args()
+
     DATABASE_URL = get_db_url()
-    # Create tables
-    print("Creating tables...")
+    incremental = args.incremental
+    if incremental:
+        conn = psycopg2.connect(DATABASE_URL)
+        cursor = conn.cursor()
+        cursor.execute("SELECT to_regclass('etl_load_state')")
+        if cursor.fetchone()[0] is None:
+            print("No previous load recorded; running a full load instead")
+            incremental = False
+        cursor.close()
+        conn.close()
+
+    if not incremental:
+        # Create tables
+        print("Creating tables...")
+        conn = psycopg2.connect(DATABASE_URL)
+        cursor = conn.cursor()
+        cursor.execute(STAGING_CREATE_SQL)
+        if args.partition:
+            cursor.execute(PARTITIONED_LABS_SQL)
+        conn.commit()
+        cursor.close()
+        conn.close()
+        print("Tables created successfully\n")
+
+    # What each file holds is fixed before staging, so rows appended while the
+    # load runs are left for the next --incremental run instead of recorded as loaded
     conn = psycopg2.connect(DATABASE_URL)
-    cursor = conn.cursor()
-    cursor.execute(STAGING_CREATE_SQL)
-    conn.commit()
-    cursor.close()
+    if incremental:
+        plans = {name: delta_plan(conn, name) for name in FILES}
+    else:
+        snapshots = {name: file_snapshot(name) for name in FILES}
+
+    # Partitions must exist before staging routes lab rows into them
+    granularity = lab_partition_granularity(conn) or (args.partition if not incremental else None)
+    if args.partition and incremental and granularity is None:
+        print("admission_lab_results is not partitioned; --partition only applies to full loads")
+    if granularity:
+        start_time = time.monotonic()
+        scan_start = (plans["labs"][0] or 0) if incremental else 0
+        periods = scan_lab_periods(FILES["labs"]["filename"], granularity, scan_start)
+        print(f"Scanned lab periods in {time.monotonic() - start_time:.2f}s")
+        ensure_lab_partitions(conn, granularity, periods)
     conn.close()
-    print("Tables created successfully\n")
 
     # Load staging data
     print("Loading staging data...")
     start_time = time.monotonic()
-    conn = psycopg2.connect(DATABASE_URL)
-    for name in FILES:
-        load_tsv_to_stage(
-            conn, 
-            FILES[name]["filename"], 
-            f"stage_{name}", 
-            EXPECTED_COLUMNS[name], 
-            FILES[name].get("batch_size", 5_000)
-        )
-    conn.close()
+    pending_state = {}
+    staged_rows = {}
+    if incremental and args.workers > 1:
+        staged_rows, pending_state = stage_file_deltas_parallel(DATABASE_URL, plans, args.workers)
+    elif incremental:
+        conn = psycopg2.connect(DATABASE_URL)
+        for name in FILES:
+            staged_rows[name], pending_state[name] = stage_file_delta(conn, name, plans[name])
+        conn.close()
+    else:
+        if args.workers > 1:
+            stage_files_parallel(DATABASE_URL, list(FILES), args.workers)
+        else:
+            conn = psycopg2.connect(DATABASE_URL)
+            for name in FILES:
+                stage_file(conn, name)
+            conn.close()
+        conn = psycopg2.connect(DATABASE_URL)
+        for name in FILES:
+            pending_state[name] = (*snapshots[name], stage_watermark(conn, name))
+        conn.close()
     end_time = time.monotonic()
     elapsed_time = end_time - start_time
     print(f"\nStaging data loaded. Elapsed time: {elapsed_time:.2f} seconds\n")
@@ -422,13 +1360,55 @@ if __name__ == "__main__":
     # Load entities
     print("Loading entity tables...")
     conn = psycopg2.connect(DATABASE_URL)
-    load_entities(conn)
+    load_entities(conn, upsert=incremental)
     conn.close()
 
     # Build facts
     print("Building fact tables...")
     conn = psycopg2.connect(DATABASE_URL)
-    build_facts(conn)
+    parallel_labs = granularity and args.workers > 1
+    if args.fast_facts and not incremental:
+        build_facts_fast(conn)
+    else:
+        build_facts(conn, upsert=incremental, labs=not parallel_labs)
+    conn.close()
+    if parallel_labs and not (args.fast_facts and not incremental):
+        load_lab_partitions_parallel(DATABASE_URL, args.workers)
+
+    # Secondary indexes and planner statistics
+    print("Building indexes...")
+    conn = psycopg2.connect(DATABASE_URL)
+    build_indexes(conn)
+    conn.close()
+
+    if (args.attach or args.detach_before) and not granularity:
+        print("admission_lab_results is not partitioned; ignoring --attach/--detach-before")
+    detached = []
+    if granularity and (args.attach or args.detach_before):
+        conn = psycopg2.connect(DATABASE_URL)
+        for archive in args.attach:
+            attach_lab_partition(conn, archive)
+        if args.detach_before:
+            detached = detach_lab_partitions(conn, args.detach_before)
+        conn.close()
+
+    # Summary views last, so they see attached and detached partitions as they are now.
+    # An incremental run only refreshes the views over tables it wrote to.
+    changed = None
+    if incremental:
+        changed = {table for name, rows in staged_rows.items() if rows for table in LOADED_TABLES[name]}
+        if granularity and (args.attach or detached):
+            changed.add("admission_lab_results")
+    print("Building summary views...")
+    conn = psycopg2.connect(DATABASE_URL)
+    build_summary_views(conn, SUMMARY_VIEWS, changed)
+    conn.close()
+
+    # Record what was loaded so the next --incremental run can skip it
+    conn = psycopg2.connect(DATABASE_URL)
+    for name in FILES:
+        save_load_state(conn, name, *pending_state[name])
+    mark_load_complete(conn, "ehr")
     conn.close()
     
     print("\n✅ Database migration complete!")
\ No newline at end of file
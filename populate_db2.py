@@ -2,12 +2,25 @@
 import psycopg2
 from psycopg2 import extras
 from datetime import datetime
-from utils import get_db_url
+from utils import get_db_url, mark_load_complete, build_summary_views
+from key_index import KeyIndex, KEY_SEP, composite_key
 import time
 import sys
 import csv
+import io
+import queue
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
 
 DATA_FILE = "data.csv"
+REJECTS_FILE = "orderdetail_rejects.tsv"
+
+ORDERDETAIL_INSERT_SQL = "INSERT INTO orderdetail (customerid, productid, orderdate, quantityordered) VALUES %s"
+ORDERDETAIL_COPY_SQL = "COPY orderdetail (customerid, productid, orderdate, quantityordered) FROM STDIN"
 
 DDL_SQL = """
 DROP TABLE IF EXISTS orderdetail CASCADE;
@@ -59,6 +72,292 @@ CREATE TABLE orderdetail (
 );
 """
 
+# Pre-aggregated sales rollups: (name, SELECT, unique key), rebuilt after each load
+SUMMARY_VIEWS = [
+    ("mv_sales_by_category", """
+        SELECT
+            pc.productcategoryid,
+            pc.productcategory,
+            count(*) AS order_count,
+            sum(od.quantityordered) AS total_quantity,
+            sum(od.quantityordered * p.productunitprice) AS total_sales
+        FROM orderdetail od
+        JOIN product p ON p.productid = od.productid
+        JOIN productcategory pc ON pc.productcategoryid = p.productcategoryid
+        GROUP BY pc.productcategoryid, pc.productcategory
+    """, ["productcategoryid"]),
+    ("mv_sales_by_product", """
+        SELECT
+            p.productid,
+            p.productname,
+            pc.productcategory,
+            count(*) AS order_count,
+            sum(od.quantityordered) AS total_quantity,
+            sum(od.quantityordered * p.productunitprice) AS total_sales
+        FROM orderdetail od
+        JOIN product p ON p.productid = od.productid
+        JOIN productcategory pc ON pc.productcategoryid = p.productcategoryid
+        GROUP BY p.productid, p.productname, pc.productcategory
+    """, ["productid"]),
+    ("mv_sales_by_country_month", """
+        SELECT
+            c.countryid,
+            c.country,
+            r.region,
+            date_trunc('month', od.orderdate)::DATE AS order_month,
+            count(*) AS order_count,
+            sum(od.quantityordered) AS total_quantity,
+            sum(od.quantityordered * p.productunitprice) AS total_sales
+        FROM orderdetail od
+        JOIN customer cu ON cu.customerid = od.customerid
+        JOIN country c ON c.countryid = cu.countryid
+        JOIN region r ON r.regionid = c.regionid
+        JOIN product p ON p.productid = od.productid
+        GROUP BY c.countryid, c.country, r.region, date_trunc('month', od.orderdate)
+    """, ["countryid", "order_month"]),
+]
+
+# ---------- ELT mode: raw lines COPYed into staging, normalized with set-based SQL ----------
+# ELT_STEPS: (progress label, table written, statement), run in order by load_sales_elt.
+# ELT mode only takes the documented field formats, on which it agrees with the Python
+# parsers row for row:
+#   ProductUnitPrice, QuantityOrdered: empty (0) or a plain decimal such as 12, -3.5 or
+#     1,234.50 (comma thousands groups)
+#   OrderDate: empty, YYYYMMDD or YYYY-MM-DD, optionally followed by 'T' or ' ' and
+#     HH:MM[:SS[.ffffff]]; impossible dates such as 2021-02-30 drop the order line, as in Python
+# A line holding anything else, or a quantity beyond INTEGER, is moved to stage_sales_rejects
+# rather than loaded; python mode parses such values leniently. Padding is stripped with the
+# same characters as str.strip().
+ELT_SETUP_SQL = r"""
+DROP TABLE IF EXISTS stage_sales_rejects CASCADE;
+DROP TABLE IF EXISTS stage_sales_items CASCADE;
+DROP TABLE IF EXISTS stage_sales_lines CASCADE;
+DROP TABLE IF EXISTS stage_sales_raw CASCADE;
+
+CREATE UNLOGGED TABLE stage_sales_raw (
+    line_no BIGSERIAL,
+    line    TEXT
+);
+
+CREATE UNLOGGED TABLE stage_sales_rejects (
+    line_no BIGINT,
+    reason  TEXT,
+    line    TEXT
+);
+
+-- Every character str.isspace() accepts, which str.strip() and str.split() act on
+CREATE OR REPLACE FUNCTION etl_ws() RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT E'\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \u0085\u00a0\u1680\u2000\u2001\u2002\u2003\u2004\u2005'
+        || E'\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000'
+$$;
+
+CREATE OR REPLACE FUNCTION etl_trim(t TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT btrim(coalesce(t, ''), etl_ws())
+$$;
+
+-- " ".join(t.split())
+CREATE OR REPLACE FUNCTION etl_squeeze(t TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT regexp_replace(etl_trim(t), '[' || etl_ws() || ']+', ' ', 'g')
+$$;
+
+-- A documented number, 0 when empty, NULL when it is anything else
+CREATE OR REPLACE FUNCTION etl_number(t TEXT) RETURNS DOUBLE PRECISION
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE
+        WHEN etl_trim(t) = '' THEN 0
+        WHEN etl_trim(t) ~ '^[+-]?([0-9]{1,3}(,[0-9]{3})+|[0-9]+)(\.[0-9]*)?$|^[+-]?\.[0-9]+$'
+            THEN replace(etl_trim(t), ',', '')::DOUBLE PRECISION
+    END
+$$;
+
+-- {year, separator, month, day, time} of a documented date, NULL when it is anything else
+CREATE OR REPLACE FUNCTION etl_date_parts(t TEXT) RETURNS TEXT[]
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT regexp_match(etl_trim(t),
+        '^([0-9]{4})(-?)([0-9]{2})\2([0-9]{2})([T ]([01][0-9]|2[0-3]):[0-5][0-9](:[0-5][0-9](\.[0-9]{1,6})?)?)?$')
+$$;
+
+CREATE OR REPLACE FUNCTION etl_make_date(y INTEGER, m INTEGER, d INTEGER) RETURNS DATE
+LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE AS $$
+BEGIN
+    IF y NOT BETWEEN 1 AND 9999 OR m NOT BETWEEN 1 AND 12 OR d < 1
+       OR d > extract(day FROM make_date(y, m, 1) + interval '1 month' - interval '1 day') THEN
+        RETURN NULL;
+    END IF;
+    RETURN make_date(y, m, d);
+END
+$$;
+
+CREATE OR REPLACE FUNCTION etl_date(t TEXT) RETURNS DATE
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT etl_make_date(p[1]::INTEGER, p[3]::INTEGER, p[4]::INTEGER) FROM etl_date_parts(t) AS p
+$$;
+
+-- Why a line falls outside the documented formats, or NULL when it does not
+CREATE OR REPLACE FUNCTION etl_reject_reason(prices TEXT[], qtys TEXT[], dates TEXT[]) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT coalesce(
+        (SELECT format('ProductUnitPrice %L is not a plain number', v)
+         FROM unnest(prices) AS v WHERE etl_number(v) IS NULL LIMIT 1),
+        (SELECT format('QuantityOrdered %L is not a plain number', v)
+         FROM unnest(qtys) AS v WHERE etl_number(v) IS NULL LIMIT 1),
+        (SELECT format('QuantityOrdered %L does not fit an INTEGER', v)
+         FROM unnest(qtys) AS v WHERE abs(trunc(etl_number(v))) >= 2147483648 LIMIT 1),
+        (SELECT format('OrderDate %L is not YYYYMMDD or YYYY-MM-DD with an optional HH:MM[:SS[.ffffff]]', v)
+         FROM unnest(dates) AS v WHERE etl_trim(v) <> '' AND etl_date_parts(v) IS NULL LIMIT 1)
+    )
+$$;
+"""
+
+# One raw line per row. load_sales_elt splits lines the way Python's text mode does and
+# escapes them for the text format, so no byte in the data can end or split a row.
+ELT_COPY_SQL = "COPY stage_sales_raw (line) FROM STDIN"
+
+ELT_STEPS = [
+    # OFFSET 0 keeps the split from being inlined (and redone) into every column below
+    ("Split lines", "stage_sales_lines", r"""
+        CREATE UNLOGGED TABLE stage_sales_lines AS
+        SELECT
+            line_no,
+            cardinality(f) AS n_parts,
+            etl_squeeze(f[1]) AS name,
+            etl_trim(f[2]) AS address,
+            etl_trim(f[3]) AS city,
+            etl_trim(f[4]) AS country,
+            etl_trim(f[5]) AS region,
+            string_to_array(etl_trim(f[6]), ';') AS productnames,
+            string_to_array(f[7], ';') AS categories,
+            string_to_array(f[8], ';') AS descriptions,
+            string_to_array(f[9], ';') AS prices,
+            string_to_array(etl_trim(f[10]), ';') AS qtys,
+            string_to_array(etl_trim(f[11]), ';') AS dates
+        FROM (
+            SELECT line_no, string_to_array(line, E'\t') AS f
+            FROM stage_sales_raw WHERE line IS NOT NULL
+            OFFSET 0
+        ) AS raw
+    """),
+    ("Rejected lines", "stage_sales_rejects", """
+        WITH rejected AS (
+            DELETE FROM stage_sales_lines l
+            WHERE etl_reject_reason(l.prices, l.qtys, l.dates) IS NOT NULL
+            RETURNING l.line_no, etl_reject_reason(l.prices, l.qtys, l.dates) AS reason
+        )
+        INSERT INTO stage_sales_rejects (line_no, reason, line)
+        SELECT j.line_no, j.reason, r.line
+        FROM rejected j
+        JOIN stage_sales_raw r ON r.line_no = j.line_no
+    """),
+    ("Inserted regions", "region", """
+        INSERT INTO region (region)
+        SELECT region FROM (
+            SELECT DISTINCT region FROM stage_sales_lines WHERE n_parts > 4 AND region <> ''
+        ) AS d
+        ORDER BY region COLLATE "C"
+    """),
+    ("Inserted countries", "country", """
+        INSERT INTO country (country, regionid)
+        SELECT d.country, r.regionid
+        FROM (
+            SELECT DISTINCT country, region FROM stage_sales_lines
+            WHERE n_parts > 4 AND country <> '' AND region <> ''
+        ) AS d
+        JOIN region r ON r.region = d.region
+        ORDER BY d.country COLLATE "C", d.region COLLATE "C"
+    """),
+    # The n-th non-empty category pairs with the n-th description, as in extract_data
+    ("Inserted product categories", "productcategory", """
+        INSERT INTO productcategory (productcategory, productcategorydescription)
+        SELECT category, description FROM (
+            SELECT DISTINCT c.category, etl_trim(l.descriptions[c.i]) AS description
+            FROM stage_sales_lines l
+            CROSS JOIN LATERAL (
+                SELECT category, row_number() OVER (ORDER BY ord) AS i
+                FROM unnest(l.categories) WITH ORDINALITY AS u(raw, ord),
+                     LATERAL etl_trim(u.raw) AS category
+                WHERE category <> ''
+            ) AS c
+            WHERE l.n_parts > 7
+        ) AS d
+        ORDER BY category COLLATE "C", description COLLATE "C"
+    """),
+    # The n-th non-empty product name pairs with the n-th category and price
+    ("Inserted products", "product", """
+        INSERT INTO product (productname, productunitprice, productcategoryid)
+        SELECT d.productname, d.price, pc.productcategoryid
+        FROM (
+            SELECT DISTINCT
+                p.productname,
+                etl_trim(l.categories[p.i]) AS category,
+                coalesce(etl_number(l.prices[p.i]), 0) AS price
+            FROM stage_sales_lines l
+            CROSS JOIN LATERAL (
+                SELECT productname, row_number() OVER (ORDER BY ord) AS i
+                FROM unnest(l.productnames) WITH ORDINALITY AS u(raw, ord),
+                     LATERAL etl_trim(u.raw) AS productname
+                WHERE productname <> ''
+            ) AS p
+            WHERE l.n_parts > 8
+        ) AS d
+        JOIN (
+            SELECT productcategory, max(productcategoryid) AS productcategoryid
+            FROM productcategory GROUP BY productcategory
+        ) AS pc ON pc.productcategory = d.category
+        ORDER BY d.productname COLLATE "C"
+    """),
+    ("Inserted customers", "customer", """
+        INSERT INTO customer (firstname, lastname, address, city, countryid)
+        SELECT d.firstname, d.lastname, d.address, d.city, c.countryid
+        FROM (
+            SELECT DISTINCT
+                split_part(name, ' ', 1) AS firstname,
+                substr(name, length(split_part(name, ' ', 1)) + 2) AS lastname,
+                address, city, country
+            FROM stage_sales_lines
+            WHERE n_parts > 4 AND name <> '' AND country <> ''
+        ) AS d
+        JOIN (SELECT country, max(countryid) AS countryid FROM country GROUP BY country) AS c
+            ON c.country = d.country
+        ORDER BY (d.firstname || ' ' || d.lastname) COLLATE "C"
+    """),
+    # Exploded order lines with ids resolved; a CREATE TABLE AS can use parallel workers.
+    # unnest() over several arrays pads the shorter quantity/date lists with NULLs.
+    ("Resolved order lines", "stage_sales_items", """
+        CREATE UNLOGGED TABLE stage_sales_items AS
+        SELECT o.line_no, o.ord, cu.customerid, pr.productid, o.orderdate, o.quantity
+        FROM (
+            SELECT
+                l.line_no,
+                p.ord,
+                l.name,
+                etl_trim(p.productname) AS productname,
+                etl_date(p.orderdate) AS orderdate,
+                trunc(etl_number(p.quantity)) AS quantity
+            FROM stage_sales_lines l
+            CROSS JOIN LATERAL unnest(l.productnames, l.qtys, l.dates)
+                WITH ORDINALITY AS p(productname, quantity, orderdate, ord)
+            WHERE l.n_parts >= 6 AND l.name <> ''
+        ) AS o
+        JOIN (
+            SELECT rtrim(firstname || ' ' || lastname) AS name, max(customerid) AS customerid
+            FROM customer GROUP BY rtrim(firstname || ' ' || lastname)
+        ) AS cu ON cu.name = o.name
+        JOIN (
+            SELECT productname, max(productid) AS productid FROM product GROUP BY productname
+        ) AS pr ON pr.productname = o.productname
+        WHERE o.orderdate IS NOT NULL
+    """),
+    ("Inserted order details", "orderdetail", """
+        INSERT INTO orderdetail (customerid, productid, orderdate, quantityordered)
+        SELECT customerid, productid, orderdate, quantity::INTEGER
+        FROM stage_sales_items
+        ORDER BY line_no, ord
+    """),
+]
+
 # Increase CSV field size limit for very large fields
 try:
     csv.field_size_limit(sys.maxsize)
@@ -66,141 +365,447 @@ except OverflowError:
     csv.field_size_limit(10**9)
 
 
-def parse_regions(path):
-    regions = set()
-    with open(path, encoding="utf-8") as f:
-        # try detect header (we assume first line is header)
-        next(f)
-        for line in f:
-            parts = line.rstrip("\n").split("\t")
-            if len(parts) > 4 and parts[4].strip():
-                regions.add(parts[4].strip())
-    return sorted(regions)
+def _parse_price(price_raw):
+    try:
+        return float(price_raw) if price_raw else 0.0
+    except Exception:
+        try:
+            return float(price_raw.replace(",", "")) if price_raw else 0.0
+        except Exception:
+            return 0.0
 
 
-def parse_countries(path):
-    pairs = set()
-    with open(path, encoding="utf-8") as f:
-        next(f)
-        for line in f:
-            parts = line.rstrip("\n").split("\t")
-            if len(parts) > 4:
-                country = parts[3].strip()
-                region = parts[4].strip()
-                if country and region:
-                    pairs.add((country, region))
-    return sorted(pairs, key=lambda x: x[0])
+def iter_spooled_orders(spool):
+    """Replay the order lines written by extract_data, one tuple per line."""
+    spool.seek(0)
+    for line in spool:
+        yield tuple(line.rstrip("\n").split("\t"))
 
 
-def parse_productcategories(path):
+def extract_data(path, max_order_bytes_in_memory=256 * 1024 * 1024):
+    """
+    Single pass over the data file that collects every dimension set and the order-line stream.
+
+    Returns a dict with the sorted regions, (country, region) pairs, (category, description)
+    pairs, (name, category, price) products and (first, last, address, city, country) customers
+    (not yet filtered by country), plus "orders", an iterator of one ORDER_COLUMNS tuple per
+    line. Order lines are kept in memory up to max_order_bytes_in_memory and spill to a temp
+    file beyond that.
+    """
+    regions = set()
+    country_pairs = set()
     cats = set()
+    prods = set()
+    custs = set()
+    spool = tempfile.SpooledTemporaryFile(max_size=max_order_bytes_in_memory, mode="w+", encoding="utf-8", newline="")
+
     with open(path, encoding="utf-8") as f:
-        next(f)
+        next(f)  # skip header
         for line in f:
             parts = line.rstrip("\n").split("\t")
-            if len(parts) > 7:
-                # guard against missing fields
+            n_parts = len(parts)
+
+            if n_parts > 4:
+                region = parts[4].strip()
+                country = parts[3].strip()
+                if region:
+                    regions.add(region)
+                    if country:
+                        country_pairs.add((country, region))
+
+                name = (parts[0] or "").strip()
+                if country and name:
+                    name_parts = name.split()
+                    first = name_parts[0]
+                    last = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
+                    custs.add((first, last, (parts[1] or "").strip(), (parts[2] or "").strip(), country))
+
+            if n_parts > 7:
                 pc_raw = parts[6] or ""
                 pcd_raw = parts[7] or ""
                 cat_list = [c.strip() for c in pc_raw.split(";") if c.strip()]
                 desc_list = [d.strip() for d in pcd_raw.split(";")] if pcd_raw else []
                 for i, cat in enumerate(cat_list):
-                    desc = desc_list[i] if i < len(desc_list) else ""
-                    cats.add((cat, desc))
-    return sorted(cats, key=lambda x: x[0])
-
+                    cats.add((cat, desc_list[i] if i < len(desc_list) else ""))
 
-def parse_products(path):
-    prods = set()
-    with open(path, encoding="utf-8") as f:
-        next(f)
-        for line in f:
-            parts = line.rstrip("\n").split("\t")
-            # guard length
-            if len(parts) > 8:
+            if n_parts > 8:
                 names_raw = parts[5] or ""
                 cats_raw = parts[6] or ""
                 prices_raw = parts[8] or ""
                 names = [n.strip() for n in names_raw.split(";") if n.strip()]
-                cats = [c.strip() for c in cats_raw.split(";")] if cats_raw else []
+                prod_cats = [c.strip() for c in cats_raw.split(";")] if cats_raw else []
                 prices = [p.strip() for p in prices_raw.split(";")] if prices_raw else []
                 for i, n in enumerate(names):
-                    if not n:
-                        continue
-                    cat = cats[i] if i < len(cats) else ""
-                    price_raw = prices[i] if i < len(prices) else ""
-                    try:
-                        price = float(price_raw) if price_raw else 0.0
-                    except Exception:
-                        try:
-                            price = float(price_raw.replace(",", "")) if price_raw else 0.0
-                        except Exception:
-                            price = 0.0
+                    cat = prod_cats[i] if i < len(prod_cats) else ""
                     if cat:
-                        prods.add((n, cat, price))
-    return sorted(prods, key=lambda x: x[0])
+                        prods.add((n, cat, _parse_price(prices[i] if i < len(prices) else "")))
+
+            if n_parts >= 6:
+                fields = [" ".join(parts[0].split()).strip()]
+                for idx in (1, 2, 3, 5, 8, 6, 9, 10):
+                    fields.append((parts[idx] or "").strip() if n_parts > idx else "")
+                spool.write("\t".join(fields))
+                spool.write("\n")
+
+    return {
+        "regions": sorted(regions),
+        "countries": sorted(country_pairs, key=lambda x: x[0]),
+        "categories": sorted(cats, key=lambda x: x[0]),
+        "products": sorted(prods, key=lambda x: x[0]),
+        "customers": sorted(custs, key=lambda x: (x[0] + " " + x[1])),
+        "orders": iter_spooled_orders(spool),
+    }
+
+
+ORDER_COLUMNS = ["name", "address", "city", "country", "productnames", "prices", "categories", "qtys", "dates"]
+
+def _parse_order_qty(q_raw):
+    try:
+        return int(float(q_raw))
+    except Exception:
+        try:
+            return int(float(q_raw.replace(",", "")))
+        except Exception:
+            return 0
 
 
-def parse_customers(path, valid_countries):
-    custs = set()
-    with open(path, encoding="utf-8") as f:
-        next(f)
-        for line in f:
-            parts = line.rstrip("\n").split("\t")
-            if len(parts) > 4:
-                name = (parts[0] or "").strip()
-                address = (parts[1] or "").strip()
-                city = (parts[2] or "").strip()
-                country = (parts[3] or "").strip()
-                if not country or country not in valid_countries:
-                    continue
-                if not name:
-                    continue
-                name_parts = name.split()
-                first = name_parts[0]
-                last = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
-                custs.add((first, last, address, city, country))
-    return sorted(custs, key=lambda x: (x[0] + " " + x[1]))
-
-
-def parse_orders_stream(path):
+def _parse_order_date(d_raw):
+    if len(d_raw) == 8 and d_raw.isdigit():
+        try:
+            return datetime.strptime(d_raw, "%Y%m%d").date()
+        except Exception:
+            return None
+    try:
+        return datetime.fromisoformat(d_raw).date()
+    except Exception:
+        try:
+            return datetime.strptime(d_raw, "%Y-%m-%d").date()
+        except Exception:
+            return None
+
+
+def _split_list(raw):
+    """Split a ;-packed field into stripped values."""
+    if not raw:
+        return []
+    return [part.strip() for part in raw.split(";")]
+
+
+def _split_aligned(values, lengths):
+    """Split ;-packed fields and pad/cut each list to the matching product count, flattened."""
+    flat = []
+    for raw, n in zip(values, lengths):
+        parts = _split_list(raw)
+        if len(parts) != n:
+            parts = parts[:n] + [None] * (n - len(parts))
+        flat.extend(parts)
+    return flat
+
+
+def transform_order_block(block, cust_map, cust_by_country, country_map, product_map):
     """
-    Generator that yields tuples (name, customer_address, city, country, prod_names_list, qtys_list, dates_list)
-    Splits the product lists and yields one line at a time.
+    Vectorized equivalent of the per-line order loop for a block of order tuples.
+
+    Explodes the ;-packed product/quantity/date lists into flat columns, parses
+    quantities and YYYYMMDD / YYYY-MM-DD dates with pandas (other spellings and
+    years outside pandas' timestamp range fall back to the per-value parsers),
+    and resolves customer and product names through KeyIndex lookups.
+    Returns (customerids, productids, orderdates, quantities) arrays for the
+    lines that resolve, in input order.
     """
-    with open(path, encoding="utf-8") as f:
-        next(f)  # skip header
-        for line in f:
-            parts = line.rstrip("\n").split("\t")
-            # be tolerant of short lines
-            if len(parts) < 6:
+    block = [row for row in block if row[0]]
+    if not block:
+        empty = np.array([], dtype="int64")
+        return empty, empty, np.array([], dtype="datetime64[D]"), empty
+    names, _, _, countries, pnames_raw, _, _, qtys_raw, dates_raw = zip(*block)
+
+    names = [" ".join(name.split()) for name in names]  # "First Last" as the customers were keyed
+    customer_ids = cust_map.lookup(names)
+    # fallback: try to find customer by first+last+country
+    retry = []
+    for i in np.flatnonzero(np.isnan(customer_ids)):
+        cid = country_map.get(countries[i]) if countries[i] else None
+        if cid:
+            first, _, last = names[i].partition(" ")  # first word, then the rest
+            retry.append((i, composite_key(first, last, cid)))
+    if retry:
+        positions, keys = zip(*retry)
+        customer_ids[list(positions)] = cust_by_country.lookup(keys)
+    found = ~np.isnan(customer_ids)
+
+    pname_lists = [_split_list(raw) if ok else [] for raw, ok in zip(pnames_raw, found)]
+    lengths = [len(pnames) for pnames in pname_lists]
+    pnames = pd.Series([name for pnames in pname_lists for name in pnames], dtype="object")
+    qtys = pd.Series(_split_aligned(qtys_raw, lengths), dtype="object")
+    raw_dates = _split_aligned(dates_raw, lengths)
+    line_customers = np.repeat(customer_ids, lengths).astype("int64", copy=False) if pnames.size else np.array([], dtype="int64")
+
+    # quantity: int(float(x)) semantics, commas and odd values through the scalar parser
+    qty = pd.to_numeric(qtys, errors="coerce").to_numpy(dtype="float64", copy=True)
+    odd = ~np.isfinite(qty)
+    qty[odd & qtys.isna().to_numpy()] = 0
+    odd &= qtys.notna().to_numpy()
+    if odd.any():
+        qty[odd] = [_parse_order_qty(q) for q in qtys[odd]]
+    qty = np.trunc(qty).astype("int64")
+
+    # date: YYYYMMDD and YYYY-MM-DD vectorized, anything else (or a year pandas cannot hold,
+    # which it would wrap around instead of rejecting) through the scalar parser
+    compact = np.fromiter((d is not None and len(d) == 8 and d.isdigit() and "1678" <= d[:4] <= "2261"
+                           for d in raw_dates), bool, len(raw_dates))
+    iso_day = np.fromiter((d is not None and len(d) == 10 and d[4] == "-" and d[7] == "-" and "1678" <= d[:4] <= "2261"
+                           for d in raw_dates), bool, len(raw_dates))
+    raw_dates = pd.Series(raw_dates, dtype="object")
+    dates = np.full(len(raw_dates), np.datetime64("NaT"), dtype="datetime64[D]")
+    if compact.any():
+        dates[compact] = pd.to_datetime(raw_dates[compact], format="%Y%m%d", errors="coerce").to_numpy()
+    if iso_day.any():
+        dates[iso_day] = pd.to_datetime(raw_dates[iso_day], format="%Y-%m-%d", errors="coerce").to_numpy()
+    other = ~compact & ~iso_day & raw_dates.notna().to_numpy() & (raw_dates != "").to_numpy()
+    if other.any():
+        dates[other] = np.array([_parse_order_date(d) for d in raw_dates[other]], dtype="datetime64[D]")
+
+    product_ids = product_map.lookup(pnames)
+    keep = (pnames != "").to_numpy() & ~np.isnat(dates) & ~np.isnan(product_ids)
+    return (
+        line_customers[keep],
+        product_ids[keep].astype("int64"),
+        dates[keep],
+        qty[keep],
+    )
+
+
+def iter_blocks(iterable, size):
+    block = []
+    for item in iterable:
+        block.append(item)
+        if len(block) >= size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def insert_orderdetail_rows(cur, rows, rejects):
+    """
+    Insert order rows inside the caller's transaction, bisecting on failure.
+
+    A failing batch is rolled back to a savepoint and split in half until the bad rows
+    are isolated, so k bad rows cost O(k log n) round trips instead of one per row.
+    Rejected rows are written to the `rejects` csv writer along with the error.
+    Returns (inserted, rejected).
+    """
+    cur.execute("SAVEPOINT orderdetail_batch")
+    try:
+        extras.execute_values(cur, ORDERDETAIL_INSERT_SQL, rows, page_size=1000)
+        result = (len(rows), 0)
+    except Exception as e:
+        cur.execute("ROLLBACK TO SAVEPOINT orderdetail_batch")
+        if len(rows) == 1:
+            error = (str(e).strip().splitlines() or [type(e).__name__])[0]
+            rejects.writerow(list(rows[0]) + [error])
+            result = (0, 1)
+        else:
+            mid = len(rows) // 2
+            left = insert_orderdetail_rows(cur, rows[:mid], rejects)
+            right = insert_orderdetail_rows(cur, rows[mid:], rejects)
+            result = (left[0] + right[0], left[1] + right[1])
+    cur.execute("RELEASE SAVEPOINT orderdetail_batch")
+    return result
+
+
+def order_batches(orders, lookups, batch_size, block_lines):
+    """
+    Yield (processed_lines, rows) with `batch_size` resolved orderdetail rows
+    each (the last batch may be shorter), transforming a block at a time.
+    """
+    insert_rows = []
+    processed_lines = 0
+    for block in iter_blocks(orders, block_lines):
+        processed_lines += len(block)
+        customer_ids, product_ids, order_dates, quantities = transform_order_block(block, *lookups)
+        insert_rows.extend(zip(customer_ids.tolist(), product_ids.tolist(), order_dates.tolist(), quantities.tolist()))
+        while len(insert_rows) >= batch_size:
+            batch, insert_rows = insert_rows[:batch_size], insert_rows[batch_size:]
+            yield processed_lines, batch
+    if insert_rows:
+        yield processed_lines, insert_rows
+
+
+def orderdetail_copy_payload(rows):
+    """COPY text-format bytes for (customerid, productid, orderdate, quantityordered) rows."""
+    return "".join(f"{c}\t{p}\t{d.isoformat()}\t{q}\n" for c, p, d, q in rows).encode("utf-8")
+
+
+def report_order_batch(inserted, rejected, total_inserted, processed_lines, start_time, final=False):
+    if rejected:
+        which = "the final batch" if final else "this batch"
+        print(f"Rejected {rejected:,} order rows from {which} (see {REJECTS_FILE})")
+    elapsed = time.time() - start_time
+    if final:
+        print(f"Inserted final {inserted:,} order rows — total {total_inserted:,} — elapsed {elapsed:.1f}s")
+    else:
+        print(f"Inserted {total_inserted:,} order rows (processed {processed_lines:,} input lines) — elapsed {elapsed:.1f}s")
+
+
+def load_orderdetail_inserts(conn, orders, lookups, rejects, batch_size, block_lines):
+    """Parse and insert order rows in turn, one execute_values batch at a time."""
+    start_time = time.time()
+    pg_cur = conn.cursor()
+    total_inserted = total_rejected = 0
+    batches = order_batches(orders, lookups, batch_size, block_lines)
+    for processed_lines, batch in batches:
+        inserted, rejected = insert_orderdetail_rows(pg_cur, batch, rejects)
+        conn.commit()
+        total_inserted += inserted
+        total_rejected += rejected
+        report_order_batch(inserted, rejected, total_inserted, processed_lines, start_time,
+                           final=len(batch) < batch_size)
+    pg_cur.close()
+    return total_inserted, total_rejected
+
+
+def _produce_order_batches(orders, lookups, batch_size, block_lines, out, stop):
+    """Parser thread: put (processed_lines, rows, payload) on `out`, then None (or the error)."""
+    def put(item):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.5)
+                return True
+            except queue.Full:
                 continue
-            name = " ".join(parts[0].split()).strip()
-            address = (parts[1] or "").strip() if len(parts) > 1 else ""
-            city = (parts[2] or "").strip() if len(parts) > 2 else ""
-            country = (parts[3] or "").strip() if len(parts) > 3 else ""
-            productnames = (parts[5] or "").strip() if len(parts) > 5 else ""
-            productunitprice = (parts[8] or "").strip() if len(parts) > 8 else ""
-            productcategory = (parts[6] or "").strip() if len(parts) > 6 else ""
-            qtys = (parts[9] or "").strip() if len(parts) > 9 else ""
-            dates = (parts[10] or "").strip() if len(parts) > 10 else ""
+        return False
 
-            yield (name, address, city, country, productnames, productunitprice, productcategory, qtys, dates)
+    try:
+        for processed_lines, batch in order_batches(orders, lookups, batch_size, block_lines):
+            if not put((processed_lines, batch, orderdetail_copy_payload(batch))):
+                return
+        put(None)
+    except Exception as e:
+        put(e)
 
 
-def main(batch_size_orders=5000):
-    db_url = get_db_url()
-    conn = psycopg2.connect(db_url)
+def load_orderdetail_copy(conn, orders, lookups, rejects, batch_size, block_lines, queue_batches=4):
+    """
+    Load order rows with COPY while a parser thread prepares the next batches.
+
+    The parser thread transforms source lines and renders COPY payloads into a
+    queue holding at most `queue_batches` batches, so it blocks (backpressure)
+    whenever the database falls behind, and the load overlaps with parsing.
+    Each batch is one COPY under a savepoint; a batch the server refuses is
+    replayed through insert_orderdetail_rows to isolate and reject the bad rows.
+    """
+    start_time = time.time()
+    pg_cur = conn.cursor()
+    batches = queue.Queue(maxsize=queue_batches)
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=_produce_order_batches,
+        args=(orders, lookups, batch_size, block_lines, batches, stop),
+        name="orderdetail-parser",
+        daemon=True,
+    )
+    producer.start()
+    total_inserted = total_rejected = 0
+    try:
+        while True:
+            item = batches.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            processed_lines, batch, payload = item
+            pg_cur.execute("SAVEPOINT orderdetail_copy")
+            try:
+                pg_cur.copy_expert(ORDERDETAIL_COPY_SQL, io.BytesIO(payload), size=1 << 20)
+                inserted, rejected = len(batch), 0
+            except psycopg2.Error:
+                pg_cur.execute("ROLLBACK TO SAVEPOINT orderdetail_copy")
+                inserted, rejected = insert_orderdetail_rows(pg_cur, batch, rejects)
+            pg_cur.execute("RELEASE SAVEPOINT orderdetail_copy")
+            conn.commit()
+            total_inserted += inserted
+            total_rejected += rejected
+            report_order_batch(inserted, rejected, total_inserted, processed_lines, start_time,
+                               final=len(batch) < batch_size)
+    finally:
+        stop.set()
+        producer.join()
+        pg_cur.close()
+    return total_inserted, total_rejected
+
+
+class _CopyTextLines:
+    """
+    Text-mode file read as one-column COPY text rows.
+
+    Python's universal newlines split the lines exactly as extract_data sees
+    them; backslashes and tabs are escaped so COPY hands each line back intact.
+    """
+
+    def __init__(self, f):
+        self.f = f
+
+    def read(self, size=-1):
+        return self.f.read(size).replace("\\", "\\\\").replace("\t", "\\t")
+
+
+def load_sales_elt(conn, path):
+    """
+    ELT load: COPY the raw data file lines into stage_sales_raw, then build every
+    table with the set-based statements in ELT_STEPS, entirely inside Postgres.
+
+    The staging tables are kept (like populate_db's stage_*) for inspection.
+    Lines outside the documented formats (see ELT_SETUP_SQL) are left out and
+    kept in stage_sales_rejects with the reason. Returns the number of
+    orderdetail rows.
+    """
     cur = conn.cursor()
+    cur.execute(ELT_SETUP_SQL)
+    conn.commit()
 
-    print("Dropping and creating tables...")
-    cur.execute(DDL_SQL)
+    print(f"Copying raw lines from {path} into stage_sales_raw...")
+    start_time = time.time()
+    with open(path, encoding="utf-8") as f:
+        next(f)  # skip header
+        cur.copy_expert(ELT_COPY_SQL, _CopyTextLines(f), size=1 << 20)
     conn.commit()
-    print("✅ Tables created")
+    print(f"✅ Copied {cur.rowcount:,} lines in {time.time() - start_time:.1f}s")
+
+    inserted = 0
+    for label, table, sql in ELT_STEPS:
+        step_start = time.time()
+        cur.execute(sql)
+        inserted = cur.rowcount
+        cur.execute(f"ANALYZE {table}")  # later steps join against it
+        conn.commit()
+        print(f"✅ {label}: {inserted:,} rows in {time.time() - step_start:.1f}s")
+        if table == "stage_sales_rejects" and inserted:
+            print(f"⚠️ {inserted:,} line(s) outside the documented formats were not loaded (see stage_sales_rejects)")
+    cur.close()
+    return inserted
+
+
+def fetch_key_index(conn, sql, params=None):
+    """KeyIndex over the (key, id) rows of a query, streamed through a server-side cursor."""
+    cur = conn.cursor(name="key_index")
+    cur.itersize = 100_000
+    cur.execute(sql, params)
+    index = KeyIndex.build(cur)
+    cur.close()
+    conn.commit()
+    return index
+
+
+def load_sales_python(conn, path, batch_size_orders, block_lines, sink, queue_batches):
+    """Normalize the data file in Python and load every table; returns (inserted, rejected) order rows."""
+    cur = conn.cursor()
+    print(f"Reading {path} (single pass)...")
+    extracted = extract_data(path)
 
     # ---------- REGION ----------
     print("Inserting regions...")
-    regions = parse_regions(DATA_FILE)
+    regions = extracted["regions"]
     if regions:
         extras.execute_batch(cur, "INSERT INTO region (region) VALUES (%s)", [(r,) for r in regions], page_size=1000)
         conn.commit()
@@ -209,7 +814,7 @@ def main(batch_size_orders=5000):
 
     # ---------- COUNTRY ----------
     print("Inserting countries...")
-    country_pairs = parse_countries(DATA_FILE)
+    country_pairs = extracted["countries"]
     country_rows = [(country, region_map[region]) for (country, region) in country_pairs if region in region_map]
     if country_rows:
         extras.execute_batch(cur, "INSERT INTO country (country, regionid) VALUES (%s, %s)", country_rows, page_size=1000)
@@ -219,7 +824,7 @@ def main(batch_size_orders=5000):
 
     # ---------- PRODUCT CATEGORY ----------
     print("Inserting product categories...")
-    categories = parse_productcategories(DATA_FILE)
+    categories = extracted["categories"]
     if categories:
         extras.execute_batch(cur, "INSERT INTO productcategory (productcategory, productcategorydescription) VALUES (%s, %s)", categories, page_size=1000)
         conn.commit()
@@ -228,164 +833,91 @@ def main(batch_size_orders=5000):
 
     # ---------- PRODUCT ----------
     print("Inserting products...")
-    products_raw = parse_products(DATA_FILE)
+    products_raw = extracted.pop("products")
     product_rows = [(name, price, cat_map[cat]) for (name, cat, price) in products_raw if cat in cat_map]
+    del products_raw
     if product_rows:
         extras.execute_batch(cur, "INSERT INTO product (productname, productunitprice, productcategoryid) VALUES (%s, %s, %s)", product_rows, page_size=1000)
         conn.commit()
-    cur.execute("SELECT productname, productid FROM product")
-    product_map = {n: pid for n, pid in cur.fetchall()}
+    del product_rows
+    product_map = fetch_key_index(conn, "SELECT productname, productid FROM product ORDER BY productid")
 
     # ---------- CUSTOMER ----------
     print("Inserting customers...")
-    customers_raw = parse_customers(DATA_FILE, set(country_map.keys()))
-    customer_rows = [(first, last, address, city, country_map[country]) for (first, last, address, city, country) in customers_raw]
+    customers_raw = extracted.pop("customers")
+    customer_rows = [(first, last, address, city, country_map[country]) for (first, last, address, city, country) in customers_raw if country in country_map]
+    del customers_raw
     if customer_rows:
         extras.execute_batch(cur, "INSERT INTO customer (firstname, lastname, address, city, countryid) VALUES (%s, %s, %s, %s, %s)", customer_rows, page_size=1000)
         conn.commit()
-    cur.execute("SELECT firstname, lastname, customerid FROM customer")
-    cust_map = {f"{f} {l}".strip(): cid for f, l, cid in cur.fetchall()}
-
-    # ---------- ORDERDETAIL (stream + batch insert) ----------
-    print("Inserting order details (streaming + batched inserts)...")
-    start_time = time.time()
-    pg_cur = conn.cursor()
-
-    insert_rows = []
-    total_inserted = 0
-    processed_lines = 0
-
-    # We'll need a quick lookup of country name -> countryid for resolving customer keys if needed
-    # country_map already has that
-
-    # iterate source rows
-    parse_orders_iterable = parse_orders_stream(DATA_FILE)
-    for (name, address, city, country, pnames_raw, prices_raw, pcats_raw, qtys_raw, dates_raw) in parse_orders_iterable :
-        processed_lines += 1
-        # resolve customer id from cust_map by First Last
-        if not name:
-            continue
-        name_parts = name.split()
-        first = name_parts[0]
-        last = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
-        customer_key = f"{first} {last}".strip()
-        customer_id = cust_map.get(customer_key)
-        if customer_id is None:
-            # fallback: try to find customer by first+last+country
-            if country:
-                cid = country_map.get(country)
-                if cid:
-                    pg_cur.execute("SELECT customerid FROM customer WHERE firstname=%s AND lastname=%s AND countryid=%s LIMIT 1", (first, last, cid))
-                    rr = pg_cur.fetchone()
-                    if rr:
-                        customer_id = rr[0]
-            if customer_id is None:
-                # if we can't resolve, skip this customer's order lines
-                continue
+    del customer_rows
+    cust_map = fetch_key_index(conn, "SELECT btrim(firstname || ' ' || lastname), customerid FROM customer ORDER BY customerid")
+    # composite (first, last, countryid) index used when the name alone does not resolve
+    cust_by_country = fetch_key_index(
+        conn, "SELECT concat_ws(%s, firstname, lastname, countryid), customerid FROM customer ORDER BY customerid", (KEY_SEP,)
+    )
+
+    # ---------- ORDERDETAIL ----------
+    lookups = (cust_map, cust_by_country, country_map, product_map)
+
+    # dead-letter file for order rows the database refuses
+    rejects_file = open(REJECTS_FILE, "w", encoding="utf-8", newline="")
+    rejects = csv.writer(rejects_file, delimiter="\t")
+    rejects.writerow(["customerid", "productid", "orderdate", "quantityordered", "error"])
+
+    if sink == "copy":
+        print("Loading order details (parser thread + COPY)...")
+        total_inserted, total_rejected = load_orderdetail_copy(
+            conn, extracted["orders"], lookups, rejects, batch_size_orders, block_lines, queue_batches
+        )
+    else:
+        print("Inserting order details (block transform + batched inserts)...")
+        total_inserted, total_rejected = load_orderdetail_inserts(
+            conn, extracted["orders"], lookups, rejects, batch_size_orders, block_lines
+        )
+
+    rejects_file.close()
+    cur.close()
+    return total_inserted, total_rejected
 
-        # prepare lists
-        pnames = [p.strip() for p in (pnames_raw or "").split(";")] if pnames_raw else []
-        qtys = [q.strip() for q in (qtys_raw or "").split(";")] if qtys_raw else []
-        dates = [d.strip() for d in (dates_raw or "").split(";")] if dates_raw else []
-        prices = [p.strip() for p in (prices_raw or "").split(";")] if prices_raw else []
-        pcats = [pc.strip() for pc in (pcats_raw or "").split(";")] if pcats_raw else []
-
-        max_len = max(len(pnames), len(qtys), len(dates), len(prices), len(pcats))
-        for i in range(max_len):
-            pname = pnames[i] if i < len(pnames) else ""
-            if not pname:
-                continue
 
-            # quantity
-            qty = 0
-            if i < len(qtys):
-                try:
-                    qty = int(float(qtys[i]))
-                except Exception:
-                    try:
-                        qty = int(float(qtys[i].replace(",", "")))
-                    except Exception:
-                        qty = 0
-
-            # date normalization
-            date_str = None
-            if i < len(dates):
-                d_raw = dates[i].strip()
-                if len(d_raw) == 8 and d_raw.isdigit():
-                    try:
-                        date_str = datetime.strptime(d_raw, "%Y%m%d").date()
-                    except Exception:
-                        date_str = None
-                else:
-                    # try parse common formats, else skip storing date
-                    try:
-                        date_str = datetime.fromisoformat(d_raw).date()
-                    except Exception:
-                        try:
-                            # day/month/year or etc - best-effort
-                            date_str = datetime.strptime(d_raw, "%Y-%m-%d").date()
-                        except Exception:
-                            date_str = None
-
-            if date_str is None:
-                # if no valid date, skip this order line
-                continue
+def main(batch_size_orders=5000, block_lines=20_000, sink="copy", queue_batches=4, mode="python"):
+    db_url = get_db_url()
+    conn = psycopg2.connect(db_url)
+    cur = conn.cursor()
 
-            product_id = product_map.get(pname)
-            if product_id is None:
-                # Optionally: try to insert missing product on-the-fly using price & category (skipped here)
-                continue
+    print("Dropping and creating tables...")
+    cur.execute(DDL_SQL)
+    conn.commit()
+    print("✅ Tables created")
 
-            insert_rows.append((customer_id, product_id, date_str, qty))
-
-            # When batch is full, flush to DB
-            if len(insert_rows) >= batch_size_orders:
-                try:
-                    extras.execute_values(pg_cur,
-                                          "INSERT INTO orderdetail (customerid, productid, orderdate, quantityordered) VALUES %s",
-                                          insert_rows,
-                                          page_size=1000)
-                    conn.commit()
-                    total_inserted += len(insert_rows)
-                    elapsed = time.time() - start_time
-                    print(f"Inserted {total_inserted:,} order rows (processed {processed_lines:,} input lines) — elapsed {elapsed:.1f}s")
-                    insert_rows = []
-                except Exception as e:
-                    conn.rollback()
-                    print("Error inserting batch of orderdetail rows:", e)
-                    # try a per-row insert fallback for the batch (skip harmful rows)
-                    for r in insert_rows:
-                        try:
-                            pg_cur.execute("INSERT INTO orderdetail (customerid, productid, orderdate, quantityordered) VALUES (%s, %s, %s, %s)", r)
-                            conn.commit()
-                            total_inserted += 1
-                        except Exception as e2:
-                            conn.rollback()
-                            print("Skipping problematic order row due to error:", e2)
-                    insert_rows = []
-
-    # final flush
-    if insert_rows:
-        try:
-            extras.execute_values(pg_cur,
-                                  "INSERT INTO orderdetail (customerid, productid, orderdate, quantityordered) VALUES %s",
-                                  insert_rows,
-                                  page_size=1000)
-            conn.commit()
-            total_inserted += len(insert_rows)
-            elapsed = time.time() - start_time
-            print(f"Inserted final {len(insert_rows):,} order rows — total {total_inserted:,} — elapsed {elapsed:.1f}s")
-        except Exception as e:
-            conn.rollback()
-            print("Error inserting final batch:", e)
+    if mode == "elt":
+        total_inserted, total_rejected = load_sales_elt(conn, DATA_FILE), 0
+    else:
+        total_inserted, total_rejected = load_sales_python(
+            conn, DATA_FILE, batch_size_orders, block_lines, sink, queue_batches
+        )
 
-    pg_cur.close()
+    print("Building summary views...")
+    build_summary_views(conn, SUMMARY_VIEWS)
+    mark_load_complete(conn, "sales")
     cur.close()
     conn.close()
     print("✅ Finished populating mini-project2 sales database")
     print(f"Total orderdetail rows inserted: {total_inserted:,}")
+    if total_rejected:
+        print(f"Total orderdetail rows rejected: {total_rejected:,} (written to {REJECTS_FILE})")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load data.csv into the mini-project2 sales database")
     # you can pass smaller batch sizes for testing
-    main(batch_size_orders=5000)
\ No newline at end of file
+    parser.add_argument("--batch-size", type=int, default=5000, help="orderdetail rows per batch")
+    parser.add_argument("--sink", choices=["copy", "insert"], default="copy",
+                        help="orderdetail load path: pipelined COPY (default) or batched INSERTs")
+    parser.add_argument("--queue-batches", type=int, default=4,
+                        help="batches the parser thread may run ahead of the COPY sink")
+    parser.add_argument("--mode", choices=["python", "elt"], default="python",
+                        help="normalize in Python (default) or COPY raw lines and transform in SQL")
+    args = parser.parse_args()
+    main(batch_size_orders=args.batch_size, sink=args.sink, queue_batches=args.queue_batches, mode=args.mode)
\ No newline at end of file
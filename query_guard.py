@@ -0,0 +1,76 @@
+"""Plan pre-flight checks and cancellation for queries run from the Streamlit apps."""
+import json
+
+
+class PlanEstimate:
+    """Planner estimates for one statement, read from EXPLAIN (FORMAT JSON)."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.total_cost = plan.get("Total Cost", 0.0)
+        self.rows = plan.get("Plan Rows", 0)
+        self.cross_joins = []
+        self._walk(plan)
+
+    def _walk(self, node):
+        children = node.get("Plans", [])
+        # A join estimated to return every pairing of its inputs has no usable join condition
+        if node.get("Node Type") == "Nested Loop" and len(children) == 2:
+            outer, inner = children[0].get("Plan Rows", 0), children[1].get("Plan Rows", 0)
+            if outer > 1 and inner > 1 and node.get("Plan Rows", 0) >= outer * inner:
+                self.cross_joins.append((outer, inner))
+        for child in children:
+            self._walk(child)
+
+    def summary(self):
+        return f"estimated cost {self.total_cost:,.0f} · estimated rows {self.rows:,}"
+
+
+def explain_query(conn, sql):
+    """Plan a statement without running it and return its PlanEstimate."""
+    cur = conn.cursor()
+    try:
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql.strip().rstrip(";"))
+        result = cur.fetchone()[0]
+    finally:
+        cur.close()
+    if isinstance(result, str):
+        result = json.loads(result)
+    return PlanEstimate(result[0]["Plan"])
+
+
+def check_plan(estimate, warn_cost, max_cost, warn_rows, max_rows):
+    """
+    Compare a PlanEstimate with the configured limits.
+
+    Returns (verdict, messages) where verdict is "ok", "warn" or "block".
+    Cartesian joins only warn on their own; they block once they push the
+    estimates over a hard limit.
+    """
+    blocks = []
+    warnings = []
+    if max_cost and estimate.total_cost > max_cost:
+        blocks.append(f"estimated cost {estimate.total_cost:,.0f} is above the limit of {max_cost:,.0f}")
+    elif warn_cost and estimate.total_cost > warn_cost:
+        warnings.append(f"estimated cost {estimate.total_cost:,.0f} is high")
+    if max_rows and estimate.rows > max_rows:
+        blocks.append(f"estimated {estimate.rows:,} rows is above the limit of {max_rows:,}")
+    elif warn_rows and estimate.rows > warn_rows:
+        warnings.append(f"estimated {estimate.rows:,} rows is a large result")
+    for outer, inner in estimate.cross_joins:
+        warnings.append(f"a join pairs every one of {outer:,} rows with {inner:,} rows; check the join condition")
+    if blocks:
+        return "block", blocks + warnings
+    if warnings:
+        return "warn", warnings
+    return "ok", []
+
+
+def cancel_backend(conn, pid):
+    """Ask the server to cancel whatever statement backend `pid` is running."""
+    cur = conn.cursor()
+    cur.execute("SELECT pg_cancel_backend(%s)", (pid,))
+    cancelled = cur.fetchone()[0]
+    cur.close()
+    conn.rollback()
+    return cancelled
@@ -0,0 +1,88 @@
+"""Background execution of queries for the Streamlit apps, with job handles the UI can poll."""
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+FINISHED = ("done", "failed", "cancelled")
+
+
+class QueryJob:
+    """
+    Handle for one query submitted to a QueryExecutor.
+
+    The worker thread fills in `status`, `result` (a DataFrame), `stream` (the
+    QueryStream still open for more pages, if any), `error` and `messages`
+    ((level, text) pairs for the UI); the session only reads them.
+    """
+
+    def __init__(self, sql, question=None, fetch_all=False):
+        self.id = uuid.uuid4().hex[:8]
+        self.sql = sql
+        self.question = question
+        self.fetch_all = fetch_all
+        self.status = "queued"
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.pid = None
+        self.stream = None
+        self.result = None
+        self.error = None
+        self.messages = []
+        self.cancel_requested = False
+        self.future = None
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    @property
+    def rows_fetched(self):
+        if self.stream is not None:
+            return self.stream.rows_fetched
+        return len(self.result) if self.result is not None else 0
+
+    def elapsed(self):
+        start = self.started_at or self.submitted_at
+        return (self.finished_at or time.monotonic()) - start
+
+
+class QueryExecutor:
+    """Thread pool that runs QueryJobs so a long query never blocks a Streamlit script run."""
+
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query")
+
+    def submit(self, job, run):
+        """Schedule run(job) and return the job; run raises to report a failure."""
+        job.future = self._executor.submit(self._run, job, run)
+        return job
+
+    @staticmethod
+    def _run(job, run):
+        if job.cancel_requested:
+            job.status = "cancelled"
+            return
+        job.status = "running"
+        job.started_at = time.monotonic()
+        try:
+            run(job)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e).strip() or type(e).__name__
+            job.status = "cancelled" if job.cancel_requested else "failed"
+        finally:
+            job.pid = None
+            job.finished_at = time.monotonic()
+
+    def cancel(self, job, cancel_backend):
+        """
+        Stop a job: drop it if it has not started, otherwise call
+        cancel_backend(pid) to cancel the statement it is running.
+        """
+        job.cancel_requested = True
+        if job.future is not None and job.future.cancel():
+            job.status = "cancelled"
+            job.finished_at = time.monotonic()
+        elif job.pid is not None:
+            cancel_backend(job.pid)
@@ -0,0 +1,167 @@
+"""Server-side cursor paging shared by the Streamlit query apps."""
+import io
+import threading
+import time
+import uuid
+import weakref
+
+import pandas as pd
+
+
+class QueryStream:
+    """
+    Page through a query result with a named (server-side) psycopg2 cursor.
+
+    Rows stay on the server until a page is asked for, so a query without a LIMIT
+    cannot pull the whole table into the Streamlit worker. Fetching stops once
+    max_rows rows or roughly max_bytes of DataFrame memory have been read; the
+    stream is then marked truncated (a result of exactly max_rows rows is not).
+
+    If `release` is given it is called with the connection once the stream is
+    closed, e.g. to hand a pooled connection back. `statement_timeout` (seconds)
+    is set for the stream's transaction, so it bounds the query and every fetch.
+    With `idle_timeout` (seconds) set, expire_if_idle closes a stream nobody has
+    fetched from for that long and marks it expired.
+    """
+
+    def __init__(self, conn, sql, page_size=1_000, max_rows=100_000, max_bytes=200 * 1024 * 1024, release=None,
+                 statement_timeout=None, idle_timeout=None):
+        self.conn = conn
+        self.sql = sql
+        self.release = release
+        self.page_size = page_size
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.columns = None
+        self.rows_fetched = 0
+        self.bytes_fetched = 0
+        self.exhausted = False
+        self.truncated = False
+        self.expired = False
+        self.idle_timeout = idle_timeout
+        self.last_used = time.monotonic()
+        self._lock = threading.RLock()  # fetches run on the session's thread, expiry on the reaper's
+        if statement_timeout:
+            cur = conn.cursor()
+            cur.execute("SET LOCAL statement_timeout = %s", (int(statement_timeout * 1000),))
+            cur.close()
+        self.cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+        self.cursor.itersize = page_size
+        self.cursor.execute(sql.strip().rstrip(";"))
+
+    def fetch_page(self, size=None):
+        """Fetch the next page as a DataFrame (empty once the stream is exhausted)."""
+        with self._lock:
+            if self.exhausted:
+                return pd.DataFrame(columns=self.columns or [])
+
+            remaining = self.max_rows - self.rows_fetched
+            limit = min(size or self.page_size, remaining)
+            # On the page that reaches max_rows, read one row past it to tell a
+            # result of exactly max_rows rows from a truncated one
+            rows = self.cursor.fetchmany(limit + 1 if limit == remaining else limit)
+            if len(rows) > limit:
+                rows = rows[:limit]
+                self.truncated = True
+            if self.columns is None:
+                self.columns = [col[0] for col in self.cursor.description]
+            df = pd.DataFrame.from_records(rows, columns=self.columns)
+
+            self.rows_fetched += len(rows)
+            self.bytes_fetched += int(df.memory_usage(deep=True).sum())
+            self.last_used = time.monotonic()
+            if self.truncated or len(rows) < limit or self.rows_fetched >= self.max_rows:
+                self.close()
+            elif self.bytes_fetched >= self.max_bytes:
+                self.truncated = True
+                self.close()
+            return df
+
+    def fetch_rest(self):
+        """Fetch every remaining page (up to the caps) as one DataFrame."""
+        pages = []
+        while not self.exhausted:
+            pages.append(self.fetch_page())
+        if not pages:
+            return pd.DataFrame(columns=self.columns or [])
+        return pd.concat(pages, ignore_index=True)
+
+    def close(self):
+        """Close the server-side cursor and release the connection."""
+        with self._lock:
+            if self.exhausted:
+                return
+            self.exhausted = True
+            try:
+                self.cursor.close()
+            except Exception:
+                pass
+            if self.release is not None:
+                release, self.release = self.release, None
+                release(self.conn)
+
+    def expire_if_idle(self):
+        """Close the stream if no page was fetched for idle_timeout seconds; returns True if it expired."""
+        with self._lock:
+            if self.exhausted or not self.idle_timeout:
+                return False
+            if time.monotonic() - self.last_used < self.idle_timeout:
+                return False
+            self.expired = True
+            self.close()
+            return True
+
+    def __del__(self):
+        # A session that goes away mid-stream must not keep its connection
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class StreamReaper:
+    """
+    Background thread that expires idle QueryStreams.
+
+    A partly paged result keeps its pooled connection idle in an open
+    transaction until the user pages to the end. Every `interval` seconds the
+    reaper calls expire_if_idle on the streams it tracks, so result grids left
+    open cannot hold on to the pool's connections indefinitely.
+    """
+
+    def __init__(self, interval=30):
+        self.interval = interval
+        self._streams = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="stream-reaper", daemon=True)
+        self._thread.start()
+
+    def track(self, stream):
+        with self._lock:
+            self._streams.add(stream)
+
+    def reap(self):
+        """Expire every tracked stream that has been idle too long; returns how many were closed."""
+        with self._lock:
+            streams = list(self._streams)
+        expired = 0
+        for stream in streams:
+            try:
+                expired += stream.expire_if_idle()
+            except Exception:
+                pass
+            if stream.exhausted:
+                with self._lock:
+                    self._streams.discard(stream)
+        return expired
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.reap()
+
+
+def dataframe_to_csv_bytes(df):
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue().encode("utf-8")
@@ -0,0 +1,113 @@
+"""In-process cache of query results shared by the Streamlit query apps."""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Quoted literals and identifiers are kept verbatim when normalizing SQL
+_QUOTED_RE = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+
+def normalize_sql(sql):
+    """Cache key for a statement: case and whitespace folded outside quotes, trailing ';' dropped."""
+    parts = _QUOTED_RE.split(sql.strip().rstrip(";").strip())
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            normalized.append(part)
+        else:
+            normalized.append(" ".join(part.split()).lower())
+    return "".join(normalized)
+
+
+def current_load_version(conn):
+    """Timestamp of the most recent finished load (see utils.mark_load_complete), or None."""
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('etl_load_version')")
+    if cur.fetchone()[0] is None:
+        cur.close()
+        return None
+    cur.execute("SELECT max(loaded_at) FROM etl_load_version")
+    version = cur.fetchone()[0]
+    cur.close()
+    return version
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of complete query results.
+
+    Entries expire after ttl_seconds, and the least recently used ones are
+    evicted once the cached DataFrames exceed max_bytes. The whole cache is
+    dropped when the database load version changes.
+    """
+
+    def __init__(self, ttl_seconds=300, max_bytes=256 * 1024 * 1024, version_check_interval=10):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.version_check_interval = version_check_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = None
+
+    def get(self, sql):
+        key = normalize_sql(sql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[2] > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, sql, df):
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return
+        key = normalize_sql(sql)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (df, size, time.monotonic())
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def sync_load_version(self, fetch_version):
+        """Clear the cache if a load finished since the last check (polled at most every interval)."""
+        now = time.monotonic()
+        if self._version_checked_at is not None and now - self._version_checked_at < self.version_check_interval:
+            return
+        version = fetch_version()
+        self._version_checked_at = now
+        if version != self._version:
+            self.clear()
+            self._version = version
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+        }
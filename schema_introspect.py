@@ -0,0 +1,224 @@
+"""Live schema introspection and compact, question-pruned schema prompts."""
+import re
+import threading
+import time
+from collections import deque
+
+COLUMNS_SQL = """
+SELECT c.relname, c.relkind, a.attname, format_type(a.atttypid, a.atttypmod)
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+WHERE n.nspname = 'public'
+  AND c.relkind IN ('r', 'p', 'v', 'm')
+  AND NOT c.relispartition
+ORDER BY c.relname, a.attnum
+"""
+
+CONSTRAINTS_SQL = """
+SELECT con.contype, c.relname,
+       ARRAY(SELECT a.attname::text
+             FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+             JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+             ORDER BY k.ord),
+       rc.relname,
+       ARRAY(SELECT a.attname::text
+             FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+             JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+             ORDER BY k.ord)
+FROM pg_constraint con
+JOIN pg_class c ON c.oid = con.conrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_class rc ON rc.oid = con.confrelid
+WHERE n.nspname = 'public' AND con.contype IN ('p', 'f')
+ORDER BY c.relname, con.conname
+"""
+
+# Cheap digest of the catalog, compared to decide whether to introspect again
+FINGERPRINT_SQL = """
+SELECT md5(
+    coalesce((SELECT string_agg(c.relname || '.' || a.attname || ':' || a.atttypid, ',' ORDER BY c.oid, a.attnum)
+              FROM pg_class c
+              JOIN pg_namespace n ON n.oid = c.relnamespace
+              JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+              WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v', 'm')), '')
+    || coalesce((SELECT string_agg(con.oid::text, ',' ORDER BY con.oid)
+                 FROM pg_constraint con
+                 JOIN pg_namespace n ON n.oid = con.connamespace
+                 WHERE n.nspname = 'public'), '')
+)
+"""
+
+SHORT_TYPES = {
+    "timestamp without time zone": "timestamp",
+    "timestamp with time zone": "timestamptz",
+    "character varying": "varchar",
+    "double precision": "float8",
+    "integer": "int",
+    "bigint": "bigint",
+}
+
+# Column-name parts too generic to say anything about which table a question is about
+GENERIC_PARTS = {"id", "desc", "string", "name", "code", "value", "start", "end", "date"}
+
+
+def introspect_schema(conn, exclude_prefixes=("stage_", "etl_", "archive_")):
+    """
+    Read tables, views, columns, primary keys and foreign keys from pg_catalog.
+
+    Returns {table: {"kind": relkind, "columns": [(name, type)], "pk": [cols],
+    "fks": [(cols, ref_table, ref_cols)]}}.
+    """
+    cur = conn.cursor()
+    cur.execute(COLUMNS_SQL)
+    schema = {}
+    for table, kind, column, col_type in cur.fetchall():
+        if table.startswith(exclude_prefixes):
+            continue
+        entry = schema.setdefault(table, {"kind": kind, "columns": [], "pk": [], "fks": []})
+        entry["columns"].append((column, SHORT_TYPES.get(col_type, col_type)))
+
+    cur.execute(CONSTRAINTS_SQL)
+    for contype, table, cols, ref_table, ref_cols in cur.fetchall():
+        if table not in schema:
+            continue
+        if contype == "p":
+            schema[table]["pk"] = cols
+        elif ref_table in schema:
+            schema[table]["fks"].append((cols, ref_table, ref_cols))
+    cur.close()
+    return schema
+
+
+def compact_schema(schema, tables=None):
+    """
+    One line per table: name(col type PK, col type ->ref_table.ref_col, ...).
+
+    Materialized views are listed in their own section ahead of the tables,
+    marked as pre-aggregated so the model answers from them when it can.
+    """
+    lines = []
+    summaries = []
+    for table in sorted(tables if tables is not None else schema):
+        entry = schema[table]
+        refs = {}
+        for cols, ref_table, ref_cols in entry["fks"]:
+            for col, ref_col in zip(cols, ref_cols):
+                refs[col] = f"{ref_table}.{ref_col}"
+        parts = []
+        for column, col_type in entry["columns"]:
+            part = f"{column} {col_type}"
+            if column in entry["pk"]:
+                part += " PK"
+            if column in refs:
+                part += f" ->{refs[column]}"
+            parts.append(part)
+        if entry["kind"] == "m":
+            summaries.append(f"- {table}({', '.join(parts)})")
+            continue
+        label = " (view)" if entry["kind"] == "v" else ""
+        lines.append(f"- {table}{label}({', '.join(parts)})")
+    sections = []
+    if summaries:
+        sections.append(
+            "Summary views (pre-aggregated, refreshed after each load; "
+            "query these instead of the tables whenever they answer the question):\n"
+            + "\n".join(summaries)
+        )
+    if lines or not summaries:
+        sections.append("Tables:\n" + "\n".join(lines))
+    return "\n\n".join(sections)
+
+
+def _similar(word, part):
+    if word == part:
+        return True
+    prefix = 0
+    for a, b in zip(word, part):
+        if a != b:
+            break
+        prefix += 1
+    return prefix >= 5 or (prefix >= 3 and prefix == min(len(word), len(part)) and min(len(word), len(part)) >= 3)
+
+
+def relevant_tables(schema, question, hints=None):
+    """
+    Tables a question is likely about, closed over the FK graph.
+
+    A table matches when a question word resembles a part of its name or of one
+    of its non-key column names (or when `hints` maps a word to it). Tables on the
+    shortest FK paths between matches and the lookup tables they reference are
+    added so the model can still write the joins. With no match the whole schema
+    is returned.
+    """
+    words = set(re.findall(r"[a-z0-9]+", question.lower()))
+    matched = set()
+    for word in words:
+        for table in (hints or {}).get(word, []):
+            if table in schema:
+                matched.add(table)
+    for table, entry in schema.items():
+        parts = set(table.split("_"))
+        # key columns name other entities (patient_id on admissions), so only plain columns count
+        key_columns = set(entry["pk"]).union(*(cols for cols, _, _ in entry["fks"]))
+        for column, _ in entry["columns"]:
+            if column not in key_columns:
+                parts.update(p for p in column.split("_") if p not in GENERIC_PARTS)
+        if any(_similar(word, part) for word in words for part in parts if len(part) >= 3):
+            matched.add(table)
+    if not matched:
+        return set(schema)
+
+    graph = {table: set() for table in schema}
+    for table, entry in schema.items():
+        for _, ref_table, _ in entry["fks"]:
+            graph[table].add(ref_table)
+            graph[ref_table].add(table)
+
+    selected = set(matched)
+    targets = sorted(matched)
+    for i, source in enumerate(targets):
+        parents = {source: None}
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            for neighbour in sorted(graph[node]):
+                if neighbour not in parents:
+                    parents[neighbour] = node
+                    queue.append(neighbour)
+        for target in targets[i + 1:]:
+            node = target if target in parents else None
+            while node is not None:
+                selected.add(node)
+                node = parents[node]
+
+    for table in list(selected):
+        for _, ref_table, _ in schema[table]["fks"]:
+            selected.add(ref_table)
+    return selected
+
+
+class SchemaCatalog:
+    """Caches the introspected schema and re-reads it when the catalog fingerprint changes."""
+
+    def __init__(self, refresh_interval=60, exclude_prefixes=("stage_", "etl_", "archive_")):
+        self.refresh_interval = refresh_interval
+        self.exclude_prefixes = exclude_prefixes
+        self._schema = None
+        self._fingerprint = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def get(self, conn):
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is None or now - self._checked_at >= self.refresh_interval:
+                cur = conn.cursor()
+                cur.execute(FINGERPRINT_SQL)
+                fingerprint = cur.fetchone()[0]
+                cur.close()
+                if fingerprint != self._fingerprint:
+                    self._schema = introspect_schema(conn, self.exclude_prefixes)
+                    self._fingerprint = fingerprint
+                self._checked_at = now
+            return self._schema
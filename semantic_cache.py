@@ -0,0 +1,150 @@
+"""Similarity lookup of previously validated question -> SQL pairs, fully offline."""
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Abbreviations and near-synonyms analysts use for the same thing
+SYNONYMS = {
+    "avg": "average",
+    "mean": "average",
+    "los": "length stay",
+    "qty": "quantity",
+    "num": "number",
+    "count": "number",
+    "many": "number",
+    "amount": "total",
+    "sum": "total",
+    "pts": "patients",
+    "patient": "patients",
+    "admission": "admissions",
+    "customer": "customers",
+    "product": "products",
+    "order": "orders",
+    "sale": "sales",
+}
+
+STOPWORDS = {
+    "a", "an", "the", "what", "whats", "is", "are", "was", "were", "of", "for", "by", "per",
+    "in", "on", "to", "do", "does", "we", "have", "has", "me", "show", "give", "list", "tell",
+    "how", "please", "and", "with", "our", "there", "all", "each", "which", "that",
+}
+
+
+def question_terms(question):
+    terms = []
+    for token in _TOKEN_RE.findall(question.lower()):
+        for term in SYNONYMS.get(token, token).split():
+            if term not in STOPWORDS:
+                terms.append(term)
+    return terms
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache over questions whose SQL ran successfully.
+
+    Questions are turned into hashed unigram+bigram TF-IDF vectors held in a
+    NumPy matrix; a lookup returns the stored SQL of the most similar question
+    when its cosine similarity reaches `threshold`. Pairs are persisted in a
+    SQLite table (one namespace per schema) and reloaded on startup.
+    """
+
+    def __init__(self, path, namespace, threshold=0.8, dim=4096, max_entries=2_000):
+        self.namespace = namespace
+        self.threshold = threshold
+        self.dim = dim
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._questions = []
+        self._sql = []
+        self._tf = np.zeros((0, dim), dtype=np.float32)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS validated_queries (
+                id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                namespace  TEXT NOT NULL,
+                question   TEXT NOT NULL,
+                sql        TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+        rows = self._db.execute(
+            "SELECT question, sql FROM validated_queries WHERE namespace = ? ORDER BY id DESC LIMIT ?",
+            (namespace, max_entries),
+        ).fetchall()
+        for question, sql in reversed(rows):
+            self._append(question, sql)
+
+    def _vector(self, question):
+        terms = question_terms(question)
+        features = terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])]
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for feature in features:
+            vec[zlib.crc32(feature.encode("utf-8")) % self.dim] += 1.0
+        np.log1p(vec, out=vec)  # sublinear term frequency
+        return vec
+
+    def _append(self, question, sql):
+        self._questions.append(question)
+        self._sql.append(sql)
+        self._tf = np.vstack([self._tf, self._vector(question)])
+        if len(self._questions) > self.max_entries:
+            self._questions.pop(0)
+            self._sql.pop(0)
+            self._tf = self._tf[1:]
+
+    def lookup(self, question):
+        """Return (sql, similarity, matched question) for the closest match above threshold, else None."""
+        with self._lock:
+            if not self._questions:
+                self.misses += 1
+                return None
+            n_docs = self._tf.shape[0]
+            doc_freq = np.count_nonzero(self._tf, axis=0)
+            idf = np.log((1.0 + n_docs) / (1.0 + doc_freq)) + 1.0
+
+            docs = self._tf * idf
+            query = self._vector(question) * idf
+            norms = np.linalg.norm(docs, axis=1) * np.linalg.norm(query)
+            scores = np.divide(docs @ query, norms, out=np.zeros(n_docs, dtype=np.float32), where=norms > 0)
+
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._sql[best], float(scores[best]), self._questions[best]
+
+    def add(self, question, sql):
+        """Remember a question whose SQL executed successfully."""
+        with self._lock:
+            if question in self._questions:
+                # The newest SQL for a question replaces the older one
+                keep = [i for i, q in enumerate(self._questions) if q != question]
+                self._questions = [self._questions[i] for i in keep]
+                self._sql = [self._sql[i] for i in keep]
+                self._tf = self._tf[keep]
+                self._db.execute(
+                    "DELETE FROM validated_queries WHERE namespace = ? AND question = ?",
+                    (self.namespace, question),
+                )
+            self._db.execute(
+                "INSERT INTO validated_queries (namespace, question, sql, created_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, question, sql, time.time()),
+            )
+            self._db.execute(
+                "DELETE FROM validated_queries WHERE namespace = ? AND id NOT IN ("
+                "SELECT id FROM validated_queries WHERE namespace = ? ORDER BY id DESC LIMIT ?)",
+                (self.namespace, self.namespace, self.max_entries),
+            )
+            self._db.commit()
+            self._append(question, sql)
@@ -0,0 +1,69 @@
+"""Incremental SQL extraction from streamed model output, plus an offline fake model."""
+import time
+
+
+class SqlStreamExtractor:
+    """
+    Turn partial model output into the SQL seen so far.
+
+    A leading ```sql fence is dropped once it is complete, text after a closing
+    fence is ignored, and backticks at the very end are held back because they
+    may be the start of the closing fence.
+    """
+
+    def __init__(self):
+        self.text = ""
+
+    def feed(self, chunk):
+        """Add a chunk of model output and return the current SQL preview."""
+        self.text += chunk
+        return self.preview()
+
+    def preview(self):
+        body = self.text.lstrip()
+        if body.startswith("```"):
+            newline = body.find("\n")
+            if newline == -1:
+                return ""  # the opening fence is still arriving
+            body = body[newline + 1:]
+        end = body.find("```")
+        if end != -1:
+            body = body[:end]
+        else:
+            body = body.rstrip("`")
+        return body.strip()
+
+
+def stream_sql(chunks, extract, on_preview=None):
+    """
+    Consume text chunks from a streaming model call.
+
+    on_preview(sql) is called whenever the SQL seen so far changes; the full
+    response is passed through `extract` at the end, so the result matches the
+    non-streaming path.
+    """
+    extractor = SqlStreamExtractor()
+    shown = None
+    for chunk in chunks:
+        if not chunk:
+            continue
+        preview = extractor.feed(chunk)
+        if on_preview is not None and preview != shown:
+            on_preview(preview)
+            shown = preview
+    return extract(extractor.text)
+
+
+class FakeStreamingModel:
+    """Offline stand-in for a streaming model: replays a fixed response in small chunks."""
+
+    def __init__(self, response_text, chunk_size=6, delay=0.02):
+        self.response_text = response_text
+        self.chunk_size = chunk_size
+        self.delay = delay
+
+    def stream(self, prompt):
+        for start in range(0, len(self.response_text), self.chunk_size):
+            if self.delay:
+                time.sleep(self.delay)
+            yield self.response_text[start:start + self.chunk_size]
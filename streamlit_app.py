@@ -1,19 +1,59 @@
 import re
 import streamlit as st
 import pandas as pd
-import psycopg2
 from dotenv import load_dotenv
 from openai import OpenAI
 import google.generativeai as genai
 import os
 import bcrypt
 
+from db_pool import ConnectionPool
+from query_stream import QueryStream, StreamReaper, dataframe_to_csv_bytes
+from copy_fetch import copy_query_to_dataframe
+from result_cache import ResultCache, current_load_version
+from generation_cache import GenerationCache, schema_hash
+from semantic_cache import SemanticCache
+from schema_introspect import SchemaCatalog, compact_schema, relevant_tables
+from query_guard import explain_query, check_plan, cancel_backend
+from query_jobs import QueryExecutor, QueryJob
+from sql_streaming import FakeStreamingModel, stream_sql
+
 
 load_dotenv()  # reads variables from a .env file and sets them in os.environ
 
 GEMINI_API_KEY  = st.secrets["OPENAI_API_KEY"]
 HASHED_PASSWORD = st.secrets["HASHED_PASSWORD"].encode("utf-8")
 
+# Result streaming limits (rows per page, and caps on what one query may pull)
+QUERY_PAGE_SIZE = int(st.secrets.get("QUERY_PAGE_SIZE", 1_000))
+QUERY_MAX_ROWS = int(st.secrets.get("QUERY_MAX_ROWS", 100_000))
+QUERY_MAX_BYTES = int(st.secrets.get("QUERY_MAX_MB", 200)) * 1024 * 1024
+# A partly read result gives its pooled connection back after this long without a page fetch
+QUERY_STREAM_IDLE_SECONDS = int(st.secrets.get("QUERY_STREAM_IDLE_SECONDS", 300))
+# "cursor" pages through a server-side cursor; "copy" fetches whole results with COPY into typed columns
+QUERY_FETCH_MODE = st.secrets.get("QUERY_FETCH_MODE", "cursor")
+DB_POOL_MIN = int(st.secrets.get("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(st.secrets.get("DB_POOL_MAX", 10))
+RESULT_CACHE_TTL = int(st.secrets.get("RESULT_CACHE_TTL", 300))
+RESULT_CACHE_BYTES = int(st.secrets.get("RESULT_CACHE_MB", 256)) * 1024 * 1024
+GENERATION_CACHE_PATH = st.secrets.get("GENERATION_CACHE_PATH", "sql_generation_cache.sqlite3")
+SEMANTIC_CACHE_THRESHOLD = float(st.secrets.get("SEMANTIC_CACHE_THRESHOLD", 0.8))
+SCHEMA_REFRESH_SECONDS = int(st.secrets.get("SCHEMA_REFRESH_SECONDS", 60))
+# Plan pre-flight limits and the per-query time limit
+QUERY_TIMEOUT_SECONDS = int(st.secrets.get("QUERY_TIMEOUT_SECONDS", 60))
+QUERY_WARN_COST = float(st.secrets.get("QUERY_WARN_COST", 1_000_000))
+QUERY_MAX_COST = float(st.secrets.get("QUERY_MAX_COST", 100_000_000))
+QUERY_WARN_PLAN_ROWS = int(st.secrets.get("QUERY_WARN_PLAN_ROWS", 1_000_000))
+QUERY_MAX_PLAN_ROWS = int(st.secrets.get("QUERY_MAX_PLAN_ROWS", 100_000_000))
+# Background query threads shared by all sessions, and how often a session polls its jobs
+QUERY_WORKERS = int(st.secrets.get("QUERY_WORKERS", DB_POOL_MAX))
+QUERY_POLL_SECONDS = float(st.secrets.get("QUERY_POLL_SECONDS", 1.0))
+
+GEMINI_MODEL = "models/gemini-2.0-flash-lite"
+GEMINI_TEMPERATURE = None  # model default
+# When set, this text is replayed as a streamed model answer instead of calling the API (offline testing)
+FAKE_LLM_RESPONSE = st.secrets.get("FAKE_LLM_RESPONSE")
+
 
 # Database schema for context
 DATABASE_SCHEMA = """
@@ -62,14 +102,38 @@ CORE TABLES:
     lab_datetime TIMESTAMP
   )
 
+SUMMARY VIEWS (pre-aggregated materialized views, refreshed after each load):
+- mv_patient_demographics (gender_desc, race_desc, marital_status_desc, language_desc,
+    patient_count, avg_age_years, avg_pct_below_poverty)
+- mv_admissions_monthly (admission_month DATE, admission_count, discharged_count, total_los_days, avg_los_days)
+- mv_diagnosis_los (diagnosis_code, diagnosis_description, admission_count, avg_los_days, min_los_days, max_los_days)
+- mv_lab_daily_stats (lab_test_id, lab_name, unit_string, lab_date DATE, result_count, avg_value, min_value, max_value)
+"""
+
+SCHEMA_NOTES = """
 IMPORTANT NOTES:
 - Use JOINs to get descriptive values from lookup tables
 - patient_dob, admission_start, admission_end, and lab_datetime are TIMESTAMP types
 - To calculate age: EXTRACT(YEAR FROM AGE(patient_dob))
 - To calculate length of stay: EXTRACT(EPOCH FROM (admission_end - admission_start)) / 86400 (gives days)
 - Always use proper JOINs for foreign key relationships
+- Prefer the mv_* summary views for counts and averages they already hold; they are far smaller than the base tables
+- Overall average length of stay from mv_admissions_monthly is SUM(total_los_days) / SUM(discharged_count)
 """
 
+# Hand-written fallback used when the live catalog cannot be read
+DATABASE_SCHEMA = DATABASE_SCHEMA + SCHEMA_NOTES
+
+# Question words that point at a table without resembling its name
+SCHEMA_HINTS = {
+    "stay": ["admissions", "mv_admissions_monthly", "mv_diagnosis_los"],
+    "los": ["admissions", "mv_admissions_monthly", "mv_diagnosis_los"],
+    "admitted": ["admissions"],
+    "age": ["patients"],
+    "born": ["patients"],
+    "poverty": ["patients"],
+}
+
 
 
 def login_screen():
@@ -128,28 +192,269 @@ DATABASE_URL = get_db_url()
 
 
 @st.cache_resource
-def get_db_connection():
-
-    """Create and cache database connection."""
+def get_db_pool():
+    """Create and cache the connection pool shared by all sessions."""
     try:
-        conn = psycopg2.connect(DATABASE_URL)
-        return conn
+        return ConnectionPool(DATABASE_URL, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX)
     except Exception as e:
         st.error(f"Failed to connect to database: {e}")
         return None
     
-def run_query(sql):
-    """Execute SQL query and return results as DataFrame."""
-    conn = get_db_connection()
-    if conn is None:
+@st.cache_resource
+def get_result_cache():
+    """Create and cache the result cache shared by all sessions."""
+    return ResultCache(ttl_seconds=RESULT_CACHE_TTL, max_bytes=RESULT_CACHE_BYTES)
+
+
+def cache_if_complete(stream):
+    """Cache the session's result once its stream has been read to the end."""
+    if stream.exhausted and not stream.truncated and not stream.expired:
+        get_result_cache().put(stream.sql, pd.concat(st.session_state.query_pages, ignore_index=True))
+
+
+def record_history_rows(stream):
+    """Once the displayed result has been read to the end, store its full row count in the history."""
+    entry = st.session_state.get("query_history_entry")
+    if entry is not None and stream.exhausted and not stream.expired:
+        entry['rows'] = stream.rows_fetched
+        entry['complete'] = True
+
+
+def close_query_stream():
+    """Close the current session's open result stream, if any."""
+    stream = st.session_state.get("query_stream")
+    if stream is not None:
+        stream.close()
+    st.session_state.query_stream = None
+    st.session_state.query_pages = []
+
+
+def execute_query_job(job, pool, cache, reaper):
+    """Run a QueryJob on a pooled connection; called on an executor thread, so no st.* calls here.
+
+    The statement is planned with EXPLAIN first and refused when the estimates
+    exceed the configured limits. Unless job.fetch_all is set only the first
+    page is read, and the open stream stays on the job for further pages until
+    `reaper` expires it for being idle.
+    """
+    conn = pool.getconn()
+    if job.cancel_requested:  # Cancel clicked while waiting for a free connection
+        pool.putconn(conn)
+        raise RuntimeError("Query cancelled before it started")
+    try:
+        cache.sync_load_version(lambda: current_load_version(conn))
+    except Exception as e:
+        conn.rollback()
+        job.messages.append(("warning", f"Could not check for new data loads: {e}"))
+    cached = cache.get(job.sql)
+    if cached is not None:
+        pool.putconn(conn)
+        job.result = cached
+        return
+
+    # Plan first, so a runaway statement is stopped before it reaches the executor
+    try:
+        estimate = explain_query(conn, job.sql)
+    except Exception as e:
+        pool.putconn(conn)
+        raise RuntimeError(f"Error executing query: {e}") from e
+    verdict, messages = check_plan(estimate, QUERY_WARN_COST, QUERY_MAX_COST, QUERY_WARN_PLAN_ROWS, QUERY_MAX_PLAN_ROWS)
+    job.messages.append(("caption", f"🧮 Plan: {estimate.summary()}"))
+    if verdict == "block":
+        pool.putconn(conn)
+        raise RuntimeError("🛑 Query not run: " + "; ".join(messages) + ". Add filters, a LIMIT or the missing join condition.")
+    if verdict == "warn":
+        job.messages.append(("warning", "⚠️ " + "; ".join(messages)))
+
+    # Publish the backend pid, then look at the flag again: a Cancel clicked before this
+    # point is caught here, one clicked after it finds the pid and cancels the statement
+    job.pid = conn.get_backend_pid()
+    if job.cancel_requested:
+        job.pid = None
+        pool.putconn(conn)
+        raise RuntimeError("Query cancelled before it started")
+    if QUERY_FETCH_MODE == "copy":
+        # Whole result in one COPY, parsed into typed (Arrow-backed when available) columns
+        try:
+            df, truncated = copy_query_to_dataframe(conn, job.sql, max_rows=QUERY_MAX_ROWS,
+                                                    statement_timeout=QUERY_TIMEOUT_SECONDS,
+                                                    max_bytes=QUERY_MAX_BYTES)
+        except Exception as e:
+            raise RuntimeError(f"Error executing query: {e}") from e
+        finally:
+            job.pid = None  # the connection may run another session's query once it is back in the pool
+            pool.putconn(conn)
+        if truncated:
+            job.messages.append(("warning", f"⚠️ Result capped at {len(df):,} rows; add a LIMIT or filter to narrow it"))
+        else:
+            cache.put(job.sql, df)
+        job.result = df
+        return
+
+    # The stream owns the checked-out connection and returns it to the pool when closed
+    stream = None
+    try:
+        stream = QueryStream(conn, job.sql, QUERY_PAGE_SIZE, QUERY_MAX_ROWS, QUERY_MAX_BYTES, release=pool.putconn,
+                             statement_timeout=QUERY_TIMEOUT_SECONDS, idle_timeout=QUERY_STREAM_IDLE_SECONDS)
+        job.stream = stream
+        df = stream.fetch_rest() if job.fetch_all else stream.fetch_page()
+        if not stream.exhausted:
+            reaper.track(stream)
+    except Exception as e:
+        job.pid = None
+        if stream is not None:
+            stream.close()
+        else:
+            pool.putconn(conn)
+        raise RuntimeError(f"Error executing query: {e}") from e
+
+    if stream.exhausted and not stream.truncated:
+        cache.put(job.sql, df)
+    job.result = df
+
+
+@st.cache_resource
+def get_query_executor():
+    """Create the thread pool that runs queries for all sessions."""
+    return QueryExecutor(max_workers=QUERY_WORKERS)
+
+
+@st.cache_resource
+def get_stream_reaper():
+    """Start the thread that closes result streams left idle, for all sessions."""
+    return StreamReaper(interval=max(1, QUERY_STREAM_IDLE_SECONDS // 10))
+
+
+def submit_query(sql, question=None, fetch_all=False):
+    """Start SQL on the query executor and track its job in the session.
+
+    Jobs with a question are added to the history and the semantic cache once
+    they succeed.
+    """
+    pool = get_db_pool()
+    if pool is None:
         return None
-    
+    cache = get_result_cache()
+    job = QueryJob(sql, question=question, fetch_all=fetch_all)
+    reaper = get_stream_reaper()
+    get_query_executor().submit(job, lambda job: execute_query_job(job, pool, cache, reaper))
+    st.session_state.query_jobs.append(job)
+    return job
+
+
+def cancel_query_job(job):
+    """Button callback: cancel a job, using another pooled connection for pg_cancel_backend."""
+    pool = get_db_pool()
+
+    def cancel(pid):
+        with pool.connection() as conn:
+            cancel_backend(conn, pid)
+
     try:
-        df = pd.read_sql_query(sql, conn)
-        return df
+        get_query_executor().cancel(job, cancel)
     except Exception as e:
-        st.error(f"Error executing query: {e}")
-        return None 
+        st.session_state.cancel_error = str(e)
+
+
+def collect_finished_jobs():
+    """Take finished jobs off the session's list; the latest success becomes the displayed result."""
+    for job in [job for job in st.session_state.query_jobs if job.done]:
+        st.session_state.query_jobs.remove(job)
+        notices = list(job.messages)
+        if job.status == "done":
+            close_query_stream()
+            st.session_state.query_stream = job.stream
+            st.session_state.query_pages = [job.result]
+            # Until a streamed result is read to the end, its history entry counts the first page only
+            entry = None
+            if job.question is not None:
+                get_semantic_cache(semantic_namespace(get_live_schema())).add(job.question, job.sql)
+                entry = {'question': job.question,
+                    'sql': job.sql,
+                    'rows': len(job.result),
+                    'complete': job.stream is None or job.stream.exhausted}
+                st.session_state.query_history.append(entry)
+            st.session_state.query_history_entry = entry
+        elif job.status == "cancelled":
+            notices.append(("info", f"Query cancelled after {job.elapsed():.1f}s"))
+        else:
+            notices.append(("error", job.error))
+        st.session_state.query_notices = notices
+
+
+@st.fragment(run_every=QUERY_POLL_SECONDS)
+def show_query_jobs():
+    """Progress of the session's queries still in flight, refreshed until they finish."""
+    jobs = st.session_state.get("query_jobs") or []
+    if any(job.done for job in jobs):
+        st.rerun()
+    for job in jobs:
+        col1, col2 = st.columns([5, 1])
+        col1.info(
+            f"⏳ {job.status.capitalize()} for {job.elapsed():.1f}s · "
+            f"{job.rows_fetched:,} rows fetched · `{' '.join(job.sql.split())[:80]}`"
+        )
+        col2.button(
+            "⛔ Cancel",
+            key=f"cancel_{job.id}",
+            on_click=cancel_query_job,
+            args=(job,),
+            disabled=job.cancel_requested,
+            width="stretch",
+        )
+
+
+def show_query_notices():
+    """Plan estimates, warnings and errors from the most recently finished query."""
+    for level, text in st.session_state.get("query_notices", []):
+        getattr(st, level)(text)
+
+
+def show_query_results():
+    """Render the rows fetched so far for the current query, with paging and download controls."""
+    pages = st.session_state.get("query_pages")
+    if not pages:
+        return
+    # No stream means the result came complete from the result cache
+    stream = st.session_state.get("query_stream")
+    df = pd.concat(pages, ignore_index=True)
+
+    st.markdown("---")
+    st.subheader("📊 Query Results")
+    if stream is None or (stream.exhausted and not stream.truncated and not stream.expired):
+        st.success(f"✅ Query returned {len(df)} rows")
+    else:
+        st.success(f"✅ Showing the first {len(df):,} rows")
+    if stream is not None and stream.expired:
+        st.info(f"ℹ️ The rest of this result was released after {QUERY_STREAM_IDLE_SECONDS}s without paging; run the query again to see more rows")
+    if stream is not None and stream.truncated:
+        st.warning(f"⚠️ Result capped at {stream.rows_fetched:,} rows (~{stream.bytes_fetched / 1e6:.0f} MB); add a LIMIT or filter to narrow it")
+    st.dataframe(df, width="stretch")
+
+    col1, col2, col3 = st.columns([1, 1, 3])
+    if stream is not None and not stream.exhausted:
+        try:
+            if col1.button("Load next page", width="stretch"):
+                st.session_state.query_pages.append(stream.fetch_page())
+                cache_if_complete(stream)
+                record_history_rows(stream)
+                st.rerun()
+            if col2.button("Fetch all", width="stretch"):
+                st.session_state.query_pages.append(stream.fetch_rest())
+                cache_if_complete(stream)
+                record_history_rows(stream)
+                st.rerun()
+        except Exception as e:
+            st.error(f"Error fetching rows: {e}")
+            close_query_stream()
+    else:
+        col1.download_button(
+            "⬇️ Download CSV",
+            data=dataframe_to_csv_bytes(df),
+            file_name="query_results.csv",
+            mime="text/csv",
+            width="stretch",
+        )
     
 
 @st.cache_resource
@@ -157,17 +462,83 @@ def get_openai_client():
     """Create and cache Gemini model (we reuse OPENAI_API_KEY for Gemini)."""
     genai.configure(api_key=GEMINI_API_KEY )
     # You can switch to "gemini-1.0-pro" if you want
-    return genai.GenerativeModel("models/gemini-2.0-flash-lite")
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+
+@st.cache_resource
+def get_generation_cache():
+    """Open the on-disk cache of generated SQL."""
+    return GenerationCache(GENERATION_CACHE_PATH)
+
+
+@st.cache_resource
+def get_schema_catalog():
+    """Create the cached view of the live database catalog."""
+    return SchemaCatalog(refresh_interval=SCHEMA_REFRESH_SECONDS)
+
+
+def get_live_schema():
+    """The introspected live schema, or None if the catalog cannot be read."""
+    pool = get_db_pool()
+    if pool is None:
+        return None
+    try:
+        with pool.connection() as conn:
+            return get_schema_catalog().get(conn)
+    except Exception:
+        return None
+
+
+def build_schema_prompt(user_question, schema):
+    """Compact live schema pruned to the question, or DATABASE_SCHEMA if the catalog cannot be read."""
+    if not schema:
+        return DATABASE_SCHEMA
+    tables = relevant_tables(schema, user_question, SCHEMA_HINTS)
+    return compact_schema(schema, tables) + "\n" + SCHEMA_NOTES
+
+
+def semantic_namespace(schema):
+    """Hash of the whole live schema prompt, so validated SQL is only reused on the schema it ran against."""
+    if not schema:
+        return schema_hash(DATABASE_SCHEMA)
+    return schema_hash(compact_schema(schema) + "\n" + SCHEMA_NOTES)
+
+
+@st.cache_resource(max_entries=4)
+def get_semantic_cache(namespace):
+    """Load the similarity index of questions whose SQL ran successfully on one schema."""
+    return SemanticCache(GENERATION_CACHE_PATH, namespace, threshold=SEMANTIC_CACHE_THRESHOLD)
 
 def extract_sql_from_response(response_text):
     clean_sql = re.sub(r"^sql\s*|\s*$", "", response_text, flags=re.IGNORECASE | re.MULTILINE).strip()
     return clean_sql
 
-def generate_sql_with_gpt(user_question):
-    model = get_openai_client()
+def model_text_chunks(prompt):
+    """Stream the model's answer as text pieces (the fake model's when FAKE_LLM_RESPONSE is set)."""
+    if FAKE_LLM_RESPONSE:
+        return FakeStreamingModel(FAKE_LLM_RESPONSE).stream(prompt)
+    response = get_openai_client().generate_content(prompt, stream=True)
+    return (chunk.text for chunk in response if chunk.parts)
+
+
+def generate_sql_with_gpt(user_question, use_cache=True, stream=False):
+    schema = get_live_schema()
+    schema_text = build_schema_prompt(user_question, schema)
+    cache = get_generation_cache()
+    if use_cache:
+        cached_sql = cache.get(user_question, schema_text, GEMINI_MODEL, GEMINI_TEMPERATURE)
+        if cached_sql:
+            st.toast("⚡ Reused SQL generated earlier for this question")
+            return cached_sql
+        match = get_semantic_cache(semantic_namespace(schema)).lookup(user_question)
+        if match:
+            similar_sql, score, similar_question = match
+            st.toast(f"⚡ Reused SQL from a similar question ({score:.0%} match): {similar_question}")
+            return similar_sql
+
     prompt = f"""You are a PostgreSQL expert. Given the following database schema and a user's question, generate a valid PostgreSQL query.
 
-{DATABASE_SCHEMA}
+{schema_text}
 
 User Question: {user_question}
 
@@ -184,8 +555,20 @@ Generate the SQL query:"""
 
     try:
         # Call Gemini instead of OpenAI
-        response = model.generate_content(prompt)
-        sql_query = extract_sql_from_response(response.text)
+        if stream:
+            # Show the SQL as it arrives; the final text still goes through extract_sql_from_response
+            preview = st.empty()
+            sql_query = stream_sql(
+                model_text_chunks(prompt),
+                extract_sql_from_response,
+                lambda sql: preview.code(sql or "…", language="sql"),
+            )
+            preview.empty()
+        else:
+            response_text = FAKE_LLM_RESPONSE or get_openai_client().generate_content(prompt).text
+            sql_query = extract_sql_from_response(response_text)
+        if sql_query and not FAKE_LLM_RESPONSE:  # never cache canned answers as real ones
+            cache.put(user_question, schema_text, GEMINI_MODEL, GEMINI_TEMPERATURE, sql_query)
         return sql_query
 
     except Exception as e:
@@ -218,6 +601,23 @@ def main():
         4. Click "Run Query" to execute           
     """)
 
+    stats = get_result_cache().stats()
+    st.sidebar.caption(
+        f"🗄️ Result cache: {stats['hits']} hits · {stats['misses']} misses · "
+        f"{stats['entries']} cached ({stats['bytes'] / 1e6:.1f} MB)"
+    )
+
+    use_generation_cache = st.sidebar.toggle(
+        "⚡ Reuse cached SQL",
+        value=True,
+        help="Answer repeated questions from SQL generated earlier instead of calling the model",
+    )
+    stream_generation = st.sidebar.toggle(
+        "📡 Stream SQL as it is generated",
+        value=True,
+        help="Show the query while the model is still writing it",
+    )
+
     st.sidebar.markdown("---")
     if st.sidebar.button("🚪Logout"):
         st.session_state.logged_in = False
@@ -231,6 +631,10 @@ def main():
         st.session_state.generated_sql = None
     if 'current_question' not in st.session_state:
         st.session_state.current_question = None
+    if 'query_jobs' not in st.session_state:
+        st.session_state.query_jobs = []
+
+    collect_finished_jobs()
 
 
     # main input
@@ -251,6 +655,8 @@ def main():
             st.session_state.query_history = []
             st.session_state.generated_sql = None
             st.session_state.current_question = None
+            st.session_state.query_notices = []
+            close_query_stream()
 
     if generate_button and user_question:
         user_question = user_question.strip()
@@ -262,7 +668,7 @@ def main():
 
 
         with st.spinner("🧠 AI is thinking and generating SQL..."):
-            sql_query = generate_sql_with_gpt(user_question)
+            sql_query = generate_sql_with_gpt(user_question, use_cache=use_generation_cache, stream=stream_generation)
             if sql_query:        
                 st.session_state.generated_sql = sql_query
                 st.session_state.current_question = user_question
@@ -284,20 +690,15 @@ def main():
             run_button = st.button("Run Query", type="primary", width="stretch")
 
         if run_button:
-            with st.spinner("Executing query ..."):
-                df = run_query(edited_sql)
-                
-                if df is not None:
-                    st.session_state.query_history.append(
-                        {'question': user_question, 
-                        'sql': edited_sql, 
-                        'rows': len(df)}
-                    )
-
-                    st.markdown("---")
-                    st.subheader("📊 Query Results")
-                    st.success(f"✅ Query returned {len(df)} rows")
-                    st.dataframe(df, width="stretch")
+            submit_query(edited_sql, question=st.session_state.current_question)
+
+    # Outside the block above, so a re-run from the history shows even without generated SQL
+    if st.session_state.pop("cancel_error", None):
+        st.warning("Could not cancel the query")
+
+    show_query_jobs()
+    show_query_notices()
+    show_query_results()
 
 
     if st.session_state.query_history:
@@ -305,13 +706,15 @@ def main():
         st.subheader("📜 Query History")
         for idx, item in enumerate(reversed(st.session_state.query_history[-5:])):
             with st.expander(f"Query {len(st.session_state.query_history)-idx}: {item['question'][:60]}..."):
-                st.markdown(f"**Question:** {item["question"]}")
+                st.markdown(f"**Question:** {item['question']}")
                 st.code(item["sql"], language="sql")
-                st.caption(f"Returned {item["rows"]} rows")
+                if item.get("complete", True):
+                    st.caption(f"Returned {item['rows']} rows")
+                else:
+                    st.caption(f"First page: {item['rows']} rows")
                 if st.button(f"Re-run this query", key=f"rerun_{idx}"):
-                    df = run_query(item["sql"])
-                    if df is not None:
-                        st.dataframe(df, width="stretch")
+                    submit_query(item["sql"], fetch_all=True)
+                    st.rerun()
 
 
 if __name__ == "__main__":
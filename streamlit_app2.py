@@ -13,18 +13,54 @@ except Exception as e:
 import re
 import streamlit as st
 import pandas as pd
-import psycopg2
 from dotenv import load_dotenv
 from google import genai  # Google GenAI SDK for Gemini
 from google.genai.errors import APIError
 import os
 import bcrypt
 
+from db_pool import ConnectionPool
+from query_stream import QueryStream, StreamReaper, dataframe_to_csv_bytes
+from copy_fetch import copy_query_to_dataframe
+from result_cache import ResultCache, current_load_version
+from generation_cache import GenerationCache, schema_hash
+from semantic_cache import SemanticCache
+from schema_introspect import SchemaCatalog, compact_schema, relevant_tables
+from query_guard import explain_query, check_plan, cancel_backend
+from query_jobs import QueryExecutor, QueryJob
+from sql_streaming import FakeStreamingModel, stream_sql
+
 load_dotenv()
 
 # --- Configuration for Gemini API ---
 GEMINI_API_KEY  = st.secrets["OPENAI_API_KEY"]
 HASHED_PASSWORD = st.secrets["HASHED_PASSWORD"].encode("utf-8")
+QUERY_PAGE_SIZE = int(st.secrets.get("QUERY_PAGE_SIZE", 1_000))
+QUERY_MAX_ROWS = int(st.secrets.get("QUERY_MAX_ROWS", 100_000))
+QUERY_MAX_BYTES = int(st.secrets.get("QUERY_MAX_MB", 200)) * 1024 * 1024
+# A partly read result gives its pooled connection back after this long without a page fetch
+QUERY_STREAM_IDLE_SECONDS = int(st.secrets.get("QUERY_STREAM_IDLE_SECONDS", 300))
+# "cursor" pages through a server-side cursor; "copy" fetches whole results with COPY into typed columns
+QUERY_FETCH_MODE = st.secrets.get("QUERY_FETCH_MODE", "cursor")
+DB_POOL_MIN = int(st.secrets.get("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(st.secrets.get("DB_POOL_MAX", 10))
+RESULT_CACHE_TTL = int(st.secrets.get("RESULT_CACHE_TTL", 300))
+RESULT_CACHE_BYTES = int(st.secrets.get("RESULT_CACHE_MB", 256)) * 1024 * 1024
+GENERATION_CACHE_PATH = st.secrets.get("GENERATION_CACHE_PATH", "sql_generation_cache.sqlite3")
+SEMANTIC_CACHE_THRESHOLD = float(st.secrets.get("SEMANTIC_CACHE_THRESHOLD", 0.8))
+SCHEMA_REFRESH_SECONDS = int(st.secrets.get("SCHEMA_REFRESH_SECONDS", 60))
+# Plan pre-flight limits and the per-query time limit
+QUERY_TIMEOUT_SECONDS = int(st.secrets.get("QUERY_TIMEOUT_SECONDS", 60))
+QUERY_WARN_COST = float(st.secrets.get("QUERY_WARN_COST", 1_000_000))
+QUERY_MAX_COST = float(st.secrets.get("QUERY_MAX_COST", 100_000_000))
+QUERY_WARN_PLAN_ROWS = int(st.secrets.get("QUERY_WARN_PLAN_ROWS", 1_000_000))
+QUERY_MAX_PLAN_ROWS = int(st.secrets.get("QUERY_MAX_PLAN_ROWS", 100_000_000))
+QUERY_WORKERS = int(st.secrets.get("QUERY_WORKERS", DB_POOL_MAX))
+QUERY_POLL_SECONDS = float(st.secrets.get("QUERY_POLL_SECONDS", 1.0))
+GEMINI_MODEL = "gemini-2.5-pro"
+GEMINI_TEMPERATURE = 0.1
+# When set, this text is replayed as a streamed model answer instead of calling the API (offline testing)
+FAKE_LLM_RESPONSE = st.secrets.get("FAKE_LLM_RESPONSE")
 # --- End Configuration ---
 
 DATABASE_SCHEMA = """
@@ -60,13 +96,34 @@ CORE TABLES:
     quantityordered INTEGER NOT NULL
 )
 
+SUMMARY VIEWS (pre-aggregated materialized views, refreshed after each load):
+- mv_sales_by_category (productcategoryid, productcategory, order_count, total_quantity, total_sales)
+- mv_sales_by_product (productid, productname, productcategory, order_count, total_quantity, total_sales)
+- mv_sales_by_country_month (countryid, country, region, order_month DATE, order_count, total_quantity, total_sales)
+"""
+
+SCHEMA_NOTES = """
 Important Notes:
 - Use JOINs to get descriptive names from foreign keys
 - orderdate is DATE type
 - Use aggregations (SUM, COUNT, AVG) to answer sales questions
 - Add LIMIT clauses where needed
+- Prefer the mv_* summary views for totals they already hold; total_sales is quantityordered * productunitprice
 """
 
+# Fallback when the live catalog cannot be read
+DATABASE_SCHEMA = DATABASE_SCHEMA + SCHEMA_NOTES
+
+# Question words that point at a table without resembling its name
+SCHEMA_HINTS = {
+    "sales": ["orderdetail", "product", "mv_sales_by_category", "mv_sales_by_product"],
+    "sold": ["orderdetail", "product", "mv_sales_by_product"],
+    "revenue": ["orderdetail", "product", "mv_sales_by_category", "mv_sales_by_product"],
+    "orders": ["orderdetail"],
+    "order": ["orderdetail"],
+    "bought": ["orderdetail"],
+}
+
 # ------------------------
 # Login Functions
 # ------------------------
@@ -114,21 +171,210 @@ def get_db_url():
 DATABASE_URL = get_db_url()
 
 @st.cache_resource
-def get_db_connection():
+def get_db_pool():
     try:
-        return psycopg2.connect(DATABASE_URL)
+        return ConnectionPool(DATABASE_URL, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX)
     except Exception as e:
         st.error(f"Failed to connect to database: {e}")
         return None
 
-def run_query(sql):
-    conn = get_db_connection()
-    if conn is None: return None
+@st.cache_resource
+def get_result_cache():
+    return ResultCache(ttl_seconds=RESULT_CACHE_TTL, max_bytes=RESULT_CACHE_BYTES)
+
+def cache_if_complete(stream):
+    if stream.exhausted and not stream.truncated and not stream.expired:
+        get_result_cache().put(stream.sql, pd.concat(st.session_state.query_pages, ignore_index=True))
+
+def record_history_rows(stream):
+    """Store the displayed result's full row count in its history entry once it is read to the end."""
+    entry = st.session_state.get("query_history_entry")
+    if entry is not None and stream.exhausted and not stream.expired:
+        entry['rows'] = stream.rows_fetched
+        entry['complete'] = True
+
+def close_query_stream():
+    stream = st.session_state.get("query_stream")
+    if stream is not None:
+        stream.close()
+    st.session_state.query_stream = None
+    st.session_state.query_pages = []
+
+def execute_query_job(job, pool, cache, reaper):
+    """Run a QueryJob on a pooled connection (executor thread: no st.* calls); EXPLAIN pre-flight first."""
+    conn = pool.getconn()
+    if job.cancel_requested:  # Cancel clicked while waiting for a free connection
+        pool.putconn(conn)
+        raise RuntimeError("Query cancelled before it started")
     try:
-        return pd.read_sql_query(sql, conn)
+        cache.sync_load_version(lambda: current_load_version(conn))
     except Exception as e:
-        st.error(f"Error executing query: {e}")
-        return None
+        conn.rollback()
+        job.messages.append(("warning", f"Could not check for new data loads: {e}"))
+    cached = cache.get(job.sql)
+    if cached is not None:
+        pool.putconn(conn)
+        job.result = cached
+        return
+    try:
+        estimate = explain_query(conn, job.sql)  # pre-flight: refuse runaway plans before executing
+    except Exception as e:
+        pool.putconn(conn)
+        raise RuntimeError(f"Error executing query: {e}") from e
+    verdict, messages = check_plan(estimate, QUERY_WARN_COST, QUERY_MAX_COST, QUERY_WARN_PLAN_ROWS, QUERY_MAX_PLAN_ROWS)
+    job.messages.append(("caption", f"🧮 Plan: {estimate.summary()}"))
+    if verdict == "block":
+        pool.putconn(conn)
+        raise RuntimeError("🛑 Query not run: " + "; ".join(messages) + ". Add filters, a LIMIT or the missing join condition.")
+    if verdict == "warn":
+        job.messages.append(("warning", "⚠️ " + "; ".join(messages)))
+    # Publish the backend pid, then look at the flag again: a Cancel clicked before this
+    # point is caught here, one clicked after it finds the pid and cancels the statement
+    job.pid = conn.get_backend_pid()
+    if job.cancel_requested:
+        job.pid = None
+        pool.putconn(conn)
+        raise RuntimeError("Query cancelled before it started")
+    if QUERY_FETCH_MODE == "copy":
+        try:
+            df, truncated = copy_query_to_dataframe(conn, job.sql, max_rows=QUERY_MAX_ROWS,
+                                                    statement_timeout=QUERY_TIMEOUT_SECONDS,
+                                                    max_bytes=QUERY_MAX_BYTES)
+        except Exception as e:
+            raise RuntimeError(f"Error executing query: {e}") from e
+        finally:
+            job.pid = None  # the connection may run another session's query once it is back in the pool
+            pool.putconn(conn)
+        if truncated:
+            job.messages.append(("warning", f"⚠️ Result capped at {len(df):,} rows; add a LIMIT or filter to narrow it"))
+        else:
+            cache.put(job.sql, df)
+        job.result = df
+        return
+
+    stream = None
+    try:
+        stream = QueryStream(conn, job.sql, QUERY_PAGE_SIZE, QUERY_MAX_ROWS, QUERY_MAX_BYTES, release=pool.putconn,
+                             statement_timeout=QUERY_TIMEOUT_SECONDS, idle_timeout=QUERY_STREAM_IDLE_SECONDS)
+        job.stream = stream
+        df = stream.fetch_rest() if job.fetch_all else stream.fetch_page()
+        if not stream.exhausted:
+            reaper.track(stream)
+    except Exception as e:
+        job.pid = None
+        if stream is not None:
+            stream.close()
+        else:
+            pool.putconn(conn)
+        raise RuntimeError(f"Error executing query: {e}") from e
+    if stream.exhausted and not stream.truncated:
+        cache.put(job.sql, df)
+    job.result = df
+
+@st.cache_resource
+def get_query_executor():
+    return QueryExecutor(max_workers=QUERY_WORKERS)
+
+@st.cache_resource
+def get_stream_reaper():
+    return StreamReaper(interval=max(1, QUERY_STREAM_IDLE_SECONDS // 10))
+
+def submit_query(sql, question=None, fetch_all=False):
+    """Start SQL in the background; jobs with a question go to the history once they succeed."""
+    pool = get_db_pool()
+    if pool is None: return None
+    cache = get_result_cache()
+    job = QueryJob(sql, question=question, fetch_all=fetch_all)
+    reaper = get_stream_reaper()
+    get_query_executor().submit(job, lambda job: execute_query_job(job, pool, cache, reaper))
+    st.session_state.query_jobs.append(job)
+    return job
+
+def cancel_query_job(job):
+    pool = get_db_pool()
+    def cancel(pid):
+        with pool.connection() as conn:
+            cancel_backend(conn, pid)
+    try:
+        get_query_executor().cancel(job, cancel)
+    except Exception as e:
+        st.session_state.cancel_error = str(e)
+
+def collect_finished_jobs():
+    """Take finished jobs off the session's list; the latest success becomes the displayed result."""
+    for job in [job for job in st.session_state.query_jobs if job.done]:
+        st.session_state.query_jobs.remove(job)
+        notices = list(job.messages)
+        if job.status == "done":
+            close_query_stream()
+            st.session_state.query_stream = job.stream
+            st.session_state.query_pages = [job.result]
+            entry = None  # counts only the first page until a streamed result is read to the end
+            if job.question is not None:
+                get_semantic_cache(semantic_namespace(get_live_schema())).add(job.question, job.sql)
+                entry = {
+                    'question': job.question,
+                    'sql': job.sql,
+                    'rows': len(job.result),
+                    'complete': job.stream is None or job.stream.exhausted
+                }
+                st.session_state.query_history.append(entry)
+            st.session_state.query_history_entry = entry
+        elif job.status == "cancelled":
+            notices.append(("info", f"Query cancelled after {job.elapsed():.1f}s"))
+        else:
+            notices.append(("error", job.error))
+        st.session_state.query_notices = notices
+
+@st.fragment(run_every=QUERY_POLL_SECONDS)
+def show_query_jobs():
+    jobs = st.session_state.get("query_jobs") or []
+    if any(job.done for job in jobs):
+        st.rerun()
+    for job in jobs:
+        col1, col2 = st.columns([5, 1])
+        col1.info(f"⏳ {job.status.capitalize()} for {job.elapsed():.1f}s · {job.rows_fetched:,} rows fetched · "
+                  f"`{' '.join(job.sql.split())[:80]}`")
+        col2.button("⛔ Cancel", key=f"cancel_{job.id}", on_click=cancel_query_job, args=(job,),
+                    disabled=job.cancel_requested, use_container_width=True)
+
+def show_query_notices():
+    for level, text in st.session_state.get("query_notices", []):
+        getattr(st, level)(text)
+
+def show_query_results():
+    pages = st.session_state.get("query_pages")
+    if not pages: return
+    stream = st.session_state.get("query_stream")  # None when served from the result cache
+    df = pd.concat(pages, ignore_index=True)
+    if stream is None or (stream.exhausted and not stream.truncated and not stream.expired):
+        st.success(f"✅ Query returned {len(df)} rows")
+    else:
+        st.success(f"✅ Showing the first {len(df):,} rows")
+    if stream is not None and stream.expired:
+        st.info(f"ℹ️ The rest of this result was released after {QUERY_STREAM_IDLE_SECONDS}s without paging; run the query again to see more rows")
+    if stream is not None and stream.truncated:
+        st.warning(f"⚠️ Result capped at {stream.rows_fetched:,} rows (~{stream.bytes_fetched / 1e6:.0f} MB); add a LIMIT or filter to narrow it")
+    st.dataframe(df, use_container_width=True)
+    col1, col2 = st.columns([1, 1])
+    if stream is not None and not stream.exhausted:
+        try:
+            if col1.button("Load next page", use_container_width=True):
+                st.session_state.query_pages.append(stream.fetch_page())
+                cache_if_complete(stream)
+                record_history_rows(stream)
+                st.rerun()
+            if col2.button("Fetch all", use_container_width=True):
+                st.session_state.query_pages.append(stream.fetch_rest())
+                cache_if_complete(stream)
+                record_history_rows(stream)
+                st.rerun()
+        except Exception as e:
+            st.error(f"Error fetching rows: {e}")
+            close_query_stream()
+    else:
+        col1.download_button("⬇️ Download CSV", data=dataframe_to_csv_bytes(df), file_name="query_results.csv",
+                             mime="text/csv", use_container_width=True)
 
 # ------------------------
 # Gemini Functions
@@ -137,15 +383,74 @@ def run_query(sql):
 def get_gemini_client():
     return genai.Client(api_key=GEMINI_API_KEY )
 
+@st.cache_resource
+def get_generation_cache():
+    return GenerationCache(GENERATION_CACHE_PATH)
+
+@st.cache_resource
+def get_schema_catalog():
+    return SchemaCatalog(refresh_interval=SCHEMA_REFRESH_SECONDS)
+
+def get_live_schema():
+    """The introspected live schema, or None if the catalog cannot be read."""
+    pool = get_db_pool()
+    if pool is None: return None
+    try:
+        with pool.connection() as conn:
+            return get_schema_catalog().get(conn)
+    except Exception:
+        return None
+
+def build_schema_prompt(user_question, schema):
+    """Compact live schema pruned to the question, or DATABASE_SCHEMA if the catalog cannot be read."""
+    if not schema: return DATABASE_SCHEMA
+    return compact_schema(schema, relevant_tables(schema, user_question, SCHEMA_HINTS)) + "\n" + SCHEMA_NOTES
+
+def semantic_namespace(schema):
+    """Hash of the whole live schema prompt; validated SQL is only reused on the schema it ran against."""
+    if not schema: return schema_hash(DATABASE_SCHEMA)
+    return schema_hash(compact_schema(schema) + "\n" + SCHEMA_NOTES)
+
+@st.cache_resource(max_entries=4)
+def get_semantic_cache(namespace):
+    return SemanticCache(GENERATION_CACHE_PATH, namespace, threshold=SEMANTIC_CACHE_THRESHOLD)
+
 def extract_sql_from_response(response_text):
     return re.sub(r"^```sql\s*|\s*```$", "", response_text, flags=re.IGNORECASE | re.MULTILINE).strip()
 
-def generate_sql_with_gemini(user_question):
-    client = get_gemini_client()
+def generation_config():
+    return genai.types.GenerateContentConfig(
+        temperature=GEMINI_TEMPERATURE,
+        system_instruction="Output ONLY raw SQL query."
+    )
+
+def model_text_chunks(prompt):
+    """Stream Gemini's answer as text pieces (the fake model's when FAKE_LLM_RESPONSE is set)."""
+    if FAKE_LLM_RESPONSE:
+        return FakeStreamingModel(FAKE_LLM_RESPONSE).stream(prompt)
+    response = get_gemini_client().models.generate_content_stream(
+        model=GEMINI_MODEL, contents=prompt, config=generation_config()
+    )
+    return (chunk.text for chunk in response)
+
+def generate_sql_with_gemini(user_question, use_cache=True, stream=False):
+    schema = get_live_schema()
+    schema_text = build_schema_prompt(user_question, schema)
+    cache = get_generation_cache()
+    if use_cache:
+        cached_sql = cache.get(user_question, schema_text, GEMINI_MODEL, GEMINI_TEMPERATURE)
+        if cached_sql:
+            st.toast("⚡ Reused SQL generated earlier for this question")
+            return cached_sql
+        match = get_semantic_cache(semantic_namespace(schema)).lookup(user_question)
+        if match:
+            similar_sql, score, similar_question = match
+            st.toast(f"⚡ Reused SQL from a similar question ({score:.0%} match): {similar_question}")
+            return similar_sql
     prompt = f"""
 You are a PostgreSQL expert. Given the following database schema and a user's question, generate a valid PostgreSQL query.
 
-{DATABASE_SCHEMA}
+{schema_text}
 
 User Question: {user_question}
 
@@ -158,15 +463,21 @@ Requirements:
 6. Add column aliases using AS.
 """
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-pro",
-            contents=prompt,
-            config=genai.types.GenerateContentConfig(
-                temperature=0.1,
-                system_instruction="Output ONLY raw SQL query."
+        if stream:
+            preview = st.empty()  # live SQL while tokens arrive; final text still goes through extract_sql_from_response
+            sql_query = stream_sql(model_text_chunks(prompt), extract_sql_from_response,
+                                   lambda sql: preview.code(sql or "…", language="sql"))
+            preview.empty()
+        elif FAKE_LLM_RESPONSE:
+            sql_query = extract_sql_from_response(FAKE_LLM_RESPONSE)
+        else:
+            response = get_gemini_client().models.generate_content(
+                model=GEMINI_MODEL, contents=prompt, config=generation_config()
             )
-        )
-        return extract_sql_from_response(response.text)
+            sql_query = extract_sql_from_response(response.text)
+        if sql_query and not FAKE_LLM_RESPONSE:  # never cache canned answers as real ones
+            cache.put(user_question, schema_text, GEMINI_MODEL, GEMINI_TEMPERATURE, sql_query)
+        return sql_query
     except APIError as e:
         st.error(f"Gemini API error: {e}")
         return None
@@ -192,6 +503,13 @@ def main():
 - Top 10 products by sales quantity
 - Orders from a specific country
 """)
+    stats = get_result_cache().stats()
+    st.sidebar.caption(f"🗄️ Result cache: {stats['hits']} hits · {stats['misses']} misses · "
+                       f"{stats['entries']} cached ({stats['bytes'] / 1e6:.1f} MB)")
+    use_generation_cache = st.sidebar.toggle("⚡ Reuse cached SQL", value=True,
+                                             help="Answer repeated questions from SQL generated earlier")
+    stream_generation = st.sidebar.toggle("📡 Stream SQL as it is generated", value=True,
+                                          help="Show the query while Gemini is still writing it")
     st.sidebar.markdown("---")
     if st.sidebar.button("🚪 Logout"):
         st.session_state.logged_in = False
@@ -204,6 +522,9 @@ def main():
         st.session_state.generated_sql = None
     if 'current_question' not in st.session_state:
         st.session_state.current_question = None
+    if 'query_jobs' not in st.session_state:
+        st.session_state.query_jobs = []
+    collect_finished_jobs()
 
     # User input
     user_question = st.text_area("Ask a question about the database:", height=100, placeholder="e.g. Top 5 products by sales?")
@@ -215,6 +536,8 @@ def main():
         st.session_state.query_history = []
         st.session_state.generated_sql = None
         st.session_state.current_question = None
+        st.session_state.query_notices = []
+        close_query_stream()
 
     if generate_button and user_question:
         user_question = user_question.strip()
@@ -222,7 +545,7 @@ def main():
             st.session_state.generated_sql = None
             st.session_state.current_question = None
         with st.spinner("🧠 Generating SQL with Gemini..."):
-            sql_query = generate_sql_with_gemini(user_question)
+            sql_query = generate_sql_with_gemini(user_question, use_cache=use_generation_cache, stream=stream_generation)
             if sql_query:
                 st.session_state.generated_sql = sql_query
                 st.session_state.current_question = user_question
@@ -233,16 +556,14 @@ def main():
             st.info(f"Question: {st.session_state.current_question}")
             edited_sql = st.text_area("Review/Edit SQL:", value=st.session_state.generated_sql, height=200)
             if st.button("Run Query"):
-                with st.spinner("Executing query ..."):
-                    df = run_query(edited_sql)
-                    if df is not None:
-                        st.session_state.query_history.append({
-                            'question': user_question,
-                            'sql': edited_sql,
-                            'rows': len(df)
-                        })
-                        st.success(f"✅ Query returned {len(df)} rows")
-                        st.dataframe(df, use_container_width=True)
+                submit_query(edited_sql, question=st.session_state.current_question)
+
+    # Jobs and results (including history re-runs) show whether or not there is generated SQL
+    if st.session_state.pop("cancel_error", None):
+        st.warning("Could not cancel the query")
+    show_query_jobs()
+    show_query_notices()
+    show_query_results()
 
     # Query History
     if st.session_state.query_history:
@@ -251,11 +572,13 @@ def main():
         for idx, item in enumerate(reversed(st.session_state.query_history[-5:])):
             with st.expander(f"{item['question'][:60]}..."):
                 st.code(item['sql'], language="sql")
-                st.caption(f"Returned {item['rows']} rows")
+                if item.get('complete', True):
+                    st.caption(f"Returned {item['rows']} rows")
+                else:
+                    st.caption(f"First page: {item['rows']} rows")
                 if st.button(f"Re-run", key=f"rerun_{idx}"):
-                    df = run_query(item['sql'])
-                    if df is not None:
-                        st.dataframe(df, use_container_width=True)
+                    submit_query(item['sql'], fetch_all=True)
+                    st.rerun()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,141 @@
+"""populate_db2's python and ELT modes load the same rows from the same data file.
+
+main() drops and recreates the sales tables, so these tests only run against a
+scratch database named by POSTGRES_TEST_DATABASE (the other POSTGRES_* settings
+are used as they are).
+"""
+import os
+import random
+
+import psycopg2
+import pytest
+
+import populate_db2
+from utils import get_db_url
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get("POSTGRES_TEST_DATABASE"), reason="POSTGRES_TEST_DATABASE is not set"
+)
+
+HEADER = [
+    "CustomerName", "CustomerAddress", "CustomerCity", "CustomerCountry", "CustomerRegion",
+    "ProductName", "ProductCategory", "ProductCategoryDescription", "ProductUnitPrice",
+    "QuantityOrdered", "OrderDate",
+]
+
+# Tables compared by content rather than by their serial ids
+SNAPSHOT_SQL = [
+    "SELECT region FROM region",
+    "SELECT c.country, r.region FROM country c JOIN region r ON r.regionid = c.regionid",
+    "SELECT productcategory, productcategorydescription FROM productcategory",
+    """SELECT p.productname, p.productunitprice, pc.productcategory
+       FROM product p JOIN productcategory pc ON pc.productcategoryid = p.productcategoryid""",
+    """SELECT cu.firstname, cu.lastname, cu.address, cu.city, c.country
+       FROM customer cu JOIN country c ON c.countryid = cu.countryid""",
+    """SELECT cu.firstname, cu.lastname, p.productname, od.orderdate, od.quantityordered
+       FROM orderdetail od
+       JOIN customer cu ON cu.customerid = od.customerid
+       JOIN product p ON p.productid = od.productid""",
+]
+
+PADDING = ["", "", " ", "\x0b", "\xa0", "\u3000", " \u2009"]
+PRICES = ["1.5", "2", "1,234.50", "-0.25", ".75", "10.", ""]
+QUANTITIES = ["1", "3", "-3", "2.7", "1,000", ""]
+DATES = [
+    "20200101", "2020-02-03", "2020-02-30", "20211301", "2021-05-06T10:00:00",
+    "2021-05-06 10:00", "2021-05-06T23:59:59.123456", "20200102 10:30:00", "",
+]
+# Values python mode parses leniently but ELT mode rejects
+OFF_FORMAT = {
+    8: ["1,2", "1_000", "abc", "inf"],
+    9: ["abc", "1_000", "1e3", "99999999999"],
+    10: ["2020-2-3", "2020-W01", "2020-01-01T10", "2020-01-01Z", "bad"],
+}
+
+
+def pad(rng, value):
+    return rng.choice(PADDING) + value + rng.choice(PADDING)
+
+
+def documented_line(rng):
+    n = rng.randint(0, 4)
+    first = rng.choice(["Ann", "Bob", "Zoë", "Émile"])
+    last = rng.choice(["Lee", "de la Cruz", "", "O'Neil"])
+    country, region = rng.choice([("USA", "NA"), ("France", "EU"), ("Spain", "EU"), ("", ""), ("USA", "")])
+    fields = [
+        pad(rng, first + rng.choice([" ", "  ", "\xa0"]) + last),
+        pad(rng, f"addr{rng.randint(0, 3)}" + rng.choice(["", "\\N", "\\", "\x01"])),
+        pad(rng, "city"),
+        pad(rng, country),
+        pad(rng, region),
+        ";".join(pad(rng, rng.choice(["P1", "P2", "P3", ""])) for _ in range(n)),
+        ";".join(pad(rng, rng.choice(["C1", "C2", ""])) for _ in range(n)),
+        ";".join(pad(rng, f"d{rng.randint(0, 2)}") for _ in range(n)),
+        ";".join(pad(rng, rng.choice(PRICES)) for _ in range(n)),
+        ";".join(pad(rng, rng.choice(QUANTITIES)) for _ in range(rng.randint(0, n + 1))),
+        ";".join(pad(rng, rng.choice(DATES)) for _ in range(rng.randint(0, n + 1))),
+    ]
+    return fields[:rng.choice([11, 11, 11, 11, 9, 7, 6, 5, 3])]
+
+
+def off_format_line(rng):
+    fields = documented_line(rng)
+    fields += [""] * (11 - len(fields))
+    index = rng.choice(list(OFF_FORMAT))
+    fields[5] = fields[5] or "P1"
+    fields[index] = rng.choice(OFF_FORMAT[index])
+    return fields
+
+
+def write_data(path, lines, rng):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("\t".join(HEADER) + "\n")
+        for fields in lines:
+            f.write("\t".join(fields) + rng.choice(["\n", "\n", "\r\n"]))
+
+
+def load(tmp_path, monkeypatch, lines, mode, seed=0):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("POSTGRES_DATABASE", os.environ["POSTGRES_TEST_DATABASE"])
+    write_data(tmp_path / populate_db2.DATA_FILE, lines, random.Random(seed))
+    populate_db2.main(mode=mode)
+
+    conn = psycopg2.connect(get_db_url())
+    cur = conn.cursor()
+    snapshot = []
+    for sql in SNAPSHOT_SQL:
+        cur.execute(sql)
+        snapshot.append(sorted(cur.fetchall(), key=repr))
+    rejects = None
+    if mode == "elt":
+        cur.execute("SELECT count(*) FROM stage_sales_rejects")
+        rejects = cur.fetchone()[0]
+    cur.close()
+    conn.close()
+    return snapshot, rejects
+
+
+def test_documented_formats_load_the_same_rows(tmp_path, monkeypatch):
+    rng = random.Random(7)
+    lines = [documented_line(rng) for _ in range(2000)]
+
+    python_rows, _ = load(tmp_path, monkeypatch, lines, "python")
+    elt_rows, rejects = load(tmp_path, monkeypatch, lines, "elt")
+
+    assert rejects == 0
+    assert len(elt_rows[-1]) > 500
+    assert elt_rows == python_rows
+
+
+def test_elt_rejects_lines_outside_the_documented_formats(tmp_path, monkeypatch):
+    rng = random.Random(11)
+    lines = [documented_line(rng) for _ in range(1000)]
+    bad = [off_format_line(rng) for _ in range(50)]
+    mixed = lines + bad
+    rng.shuffle(mixed)
+
+    python_rows, _ = load(tmp_path, monkeypatch, lines, "python")
+    elt_rows, rejects = load(tmp_path, monkeypatch, mixed, "elt")
+
+    assert rejects == len(bad)
+    assert elt_rows == python_rows
@@ -0,0 +1,67 @@
+from itertools import islice
+
+from sql_streaming import FakeStreamingModel, SqlStreamExtractor, stream_sql
+
+SQL = "SELECT region, COUNT(*)\nFROM region\nGROUP BY region;"
+
+
+def run(chunks):
+    previews = []
+    result = stream_sql(chunks, lambda text: text, previews.append)
+    return previews, result
+
+
+def test_fence_split_across_chunks():
+    extractor = SqlStreamExtractor()
+    assert extractor.feed("``") == ""
+    assert extractor.feed("`s") == ""
+    assert extractor.feed("ql") == ""
+    assert extractor.feed("\nSEL") == "SEL"
+    assert extractor.feed("ECT 1") == "SELECT 1"
+
+
+def test_trailing_backticks_in_a_later_chunk():
+    extractor = SqlStreamExtractor()
+    assert extractor.feed("```sql\nSELECT 1\n`") == "SELECT 1"
+    assert extractor.feed("`") == "SELECT 1"
+    assert extractor.feed("`\nNote: this counts rows.") == "SELECT 1"
+
+
+def test_no_fence():
+    model = FakeStreamingModel(SQL, chunk_size=5, delay=0)
+    previews, result = run(model.stream("prompt"))
+
+    assert result == SQL
+    assert previews[-1] == SQL
+    assert all(SQL.startswith(preview) for preview in previews)
+
+
+def test_fenced_response_previews_only_the_sql():
+    text = f"```sql\n{SQL}\n```\nThis groups orders by region."
+    for chunk_size in (1, 2, 3, 6, len(text)):
+        previews, result = run(FakeStreamingModel(text, chunk_size=chunk_size, delay=0).stream("prompt"))
+
+        assert result == text
+        assert previews[-1] == SQL
+        assert all(SQL.startswith(preview) for preview in previews)
+        assert len(previews) == len(set(previews))
+
+
+def test_stream_that_ends_early():
+    text = f"```sql\n{SQL}\n```"
+    chunks = islice(FakeStreamingModel(text, chunk_size=4, delay=0).stream("prompt"), 5)
+    previews, result = run(chunks)
+
+    assert result == text[:20]
+    assert previews[-1] == "SELECT region"
+
+    previews, result = run(FakeStreamingModel(text[:len(text) - 2], chunk_size=4, delay=0).stream("prompt"))
+    assert result == text[:-2]
+    assert previews[-1] == SQL
+
+
+def test_empty_chunks_are_skipped():
+    previews, result = run(["", "SELECT", "", " 1", ""])
+
+    assert previews == ["SELECT", "SELECT 1"]
+    assert result == "SELECT 1"
@@ -1,4 +1,5 @@
 import os
+import time
 from dotenv import load_dotenv
 
 
@@ -15,3 +16,64 @@ def get_db_url():
     DATABASE_URL = f"postgresql://{POSTGRES_USERNAME}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}/{POSTGRES_DATABASE}"
 
     return DATABASE_URL
+
+
+def mark_load_complete(conn, source):
+    """Record that a load finished, so the apps can drop cached query results."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS etl_load_version (
+            source    TEXT PRIMARY KEY,
+            loaded_at TIMESTAMP NOT NULL DEFAULT now()
+        );
+        INSERT INTO etl_load_version (source, loaded_at) VALUES (%s, now())
+        ON CONFLICT (source) DO UPDATE SET loaded_at = EXCLUDED.loaded_at;
+    """, (source,))
+    conn.commit()
+    cur.close()
+
+
+def summary_view_sources(conn, name):
+    """Names of the tables and views a materialized view reads from."""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT DISTINCT d.refobjid::regclass::text
+        FROM pg_rewrite r
+        JOIN pg_depend d ON d.classid = 'pg_rewrite'::regclass AND d.objid = r.oid
+        WHERE r.ev_class = %s::regclass
+          AND d.refclassid = 'pg_class'::regclass
+          AND d.refobjid <> r.ev_class
+    """, (name,))
+    sources = {row[0] for row in cur.fetchall()}
+    cur.close()
+    return sources
+
+
+def build_summary_views(conn, views, changed=None):
+    """
+    Create or refresh pre-aggregated materialized views.
+
+    `views` is a list of (name, select_sql, key_columns). A missing view is
+    created with a unique index on key_columns; an existing one is refreshed
+    CONCURRENTLY (which needs that index), so the apps can keep reading it.
+    When `changed` is a set of table names, existing views that read none of
+    them are left as they are.
+    """
+    cur = conn.cursor()
+    for name, select_sql, key_columns in views:
+        start_time = time.monotonic()
+        cur.execute("SELECT to_regclass(%s)", (name,))
+        if cur.fetchone()[0] is None:
+            cur.execute(f"CREATE MATERIALIZED VIEW {name} AS {select_sql}")
+            cur.execute(f"CREATE UNIQUE INDEX {name}_key ON {name} ({', '.join(key_columns)})")
+            action = "created"
+        elif changed is not None and not summary_view_sources(conn, name) & changed:
+            print(f"  {name:<32} unchanged")
+            continue
+        else:
+            cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}")
+            action = "refreshed"
+        cur.execute(f"ANALYZE {name}")
+        conn.commit()
+        print(f"  {name:<32} {action} in {time.monotonic() - start_time:.2f}s")
+    cur.close()